@@ -0,0 +1,38 @@
+import os
+import pytest
+from tes4py import synthetic
+
+SCALES = {
+    '10MB': 10 << 20,
+    '250MB': 250 << 20,
+    '1GB': 1 << 30,
+}
+
+SEED = 1
+
+
+def _scales():
+    names = os.environ.get('TES4PY_BENCH_SCALES', '10MB')
+    return [name.strip() for name in names.split(',') if name.strip()]
+
+
+def pytest_generate_tests(metafunc):
+    if 'scale' in metafunc.fixturenames:
+        metafunc.parametrize('scale', _scales(), scope='session')
+
+
+@pytest.fixture(scope='session')
+def synthetic_path(request, scale):
+    """
+    Synthetic plugin of the given scale, generated once and kept in the
+    pytest cache (or TES4PY_BENCH_DATA) for later runs
+    """
+    directory = os.environ.get('TES4PY_BENCH_DATA')
+    if directory is None:
+        directory = request.config.cache.mkdir('tes4py-synthetic')
+    path = os.path.join(str(directory), 'Synthetic-%s-%d-v%d.esp' % (
+        scale, SEED, synthetic.VERSION))
+    if not os.path.exists(path):
+        synthetic.generate(path + '.tmp', SCALES[scale], seed=SEED)
+        os.replace(path + '.tmp', path)
+    return path
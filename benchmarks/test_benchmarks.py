@@ -0,0 +1,116 @@
+"""
+Benchmarks of the hot paths on synthetic plugins
+
+    python -m pytest benchmarks --benchmark-autosave
+    TES4PY_BENCH_SCALES=10MB,250MB,1GB python -m pytest benchmarks \
+        --benchmark-compare
+
+Plugins are generated with a fixed seed, so saved runs are comparable
+across commits.
+"""
+import os
+import random
+import pytest
+from tes4py.espesmformat import EspEsmFormat
+from tes4py import export
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.fixture(scope='session')
+def esm(synthetic_path):
+    with EspEsmFormat(synthetic_path) as esm:
+        yield esm
+
+
+@pytest.fixture(scope='session')
+def formids(esm):
+    index = esm.formid_index
+    return random.Random(0).sample(list(index), min(len(index), 10000))
+
+
+def test_open(benchmark, synthetic_path):
+    def open_plugin():
+        with EspEsmFormat(synthetic_path) as esm:
+            return esm.header.formid
+    benchmark(open_plugin)
+
+
+def test_walk(benchmark, synthetic_path):
+    def walk():
+        with EspEsmFormat(synthetic_path) as esm:
+            return sum(1 for _ in esm.walk())
+    benchmark.pedantic(walk, rounds=3)
+
+
+def test_header_table(benchmark, synthetic_path):
+    def scan():
+        with EspEsmFormat(synthetic_path) as esm:
+            return len(esm.header_table)
+    benchmark.pedantic(scan, rounds=3)
+
+
+def test_formid_index(benchmark, synthetic_path):
+    def build():
+        with EspEsmFormat(synthetic_path) as esm:
+            return len(esm.formid_index)
+    benchmark.pedantic(build, rounds=3)
+
+
+def test_formid_lookup(benchmark, esm, formids):
+    def lookup():
+        for formid in formids:
+            esm.by_formid(formid)
+    benchmark(lookup)
+
+
+def test_subrecord_access(benchmark, esm):
+    records = list(esm['NPC_'].records)
+
+    def access():
+        for record in records:
+            record['ACBS']
+            record.getall('CNTO')
+    benchmark(access)
+
+
+def test_decoded(benchmark, esm):
+    records = list(esm['CONT'].records)
+
+    def decode():
+        for record in records:
+            record.decoded()
+    benchmark(decode)
+
+
+def test_zstring(benchmark, esm):
+    subrecords = [record['FULL'] for record in esm['CLOT'].records]
+
+    def decode():
+        for subrecord in subrecords:
+            subrecord.zstring
+    benchmark(decode)
+
+
+def test_compressed_bodies(benchmark, esm):
+    records = [record for record in esm['ARMO'].records if record.flags.is_compressed]
+
+    def inflate():
+        for record in records:
+            record.body
+    # cold cache on every round, or only lookups would be measured
+    benchmark.pedantic(inflate, setup=esm.decompression_cache.clear, rounds=10)
+
+
+@pytest.mark.parametrize('format', ['jsonl', 'csv'])
+def test_export(benchmark, synthetic_path, format):
+    def run():
+        with EspEsmFormat(synthetic_path) as esm, open(os.devnull, 'w') as f:
+            return export.export(esm, f, format, groups=['CLOT', 'DIAL'])
+    benchmark.pedantic(run, rounds=3)
+
+
+def test_query(benchmark, esm):
+    def run():
+        return sum(1 for _ in esm.query(type='REFR', flags='~deleted'))
+    benchmark.pedantic(run, rounds=3)
@@ -0,0 +1,47 @@
+"""
+Command line interface
+
+    python -m tes4py export Oblivion.esm --type WEAP -o weapons.jsonl
+"""
+import argparse
+import contextlib
+import sys
+from .espesmformat import EspEsmFormat
+from . import export
+
+
+def export_command(args):
+    with contextlib.ExitStack() as stack:
+        esm = stack.enter_context(EspEsmFormat(args.plugin))
+        if args.output == '-':
+            out = sys.stdout
+        else:
+            out = stack.enter_context(open(
+                args.output, 'w', encoding='utf-8', newline='',
+                buffering=export.BUFFER_SIZE))
+        export.export(esm, out, args.format, args.group, args.type)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tes4py')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    parser_export = commands.add_parser(
+        'export', help='stream records to JSON Lines or CSV')
+    parser_export.add_argument('plugin')
+    parser_export.add_argument('-o', '--output', default='-')
+    parser_export.add_argument(
+        '-f', '--format', choices=sorted(export.WRITERS), default='jsonl')
+    parser_export.add_argument(
+        '-g', '--group', action='append', help='top group label, repeatable')
+    parser_export.add_argument(
+        '-t', '--type', action='append', help='record type, repeatable')
+    parser_export.set_defaults(func=export_command)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,9 @@ class Flags:
         except KeyError as ex:
             raise AttributeError from ex
 
+    def __int__(self):
+        return self._val
+
     def __repr__(self):
         return '<Flags ' + ', '.join(
             '{!s}={!r}'.format(flag, getattr(self, flag))
@@ -28,24 +31,115 @@ class StructFieldMeta(type):
 
 
 class StructField(metaclass=StructFieldMeta):
+    offset = None
+    name = None
+
     def __init__(self):
         self.offset = None
 
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    @property
+    def width(self):
+        return self.offset.stop - self.offset.start
+
+    # format of the field for struct, or None if it can't be compiled
+    fmt = None
+
     def transform(self, buffer):
-        raise NotImplemented
+        raise NotImplementedError
+
+    def convert(self, values):
+        """Like transform, from the values struct unpacked for fmt"""
+        raise NotImplementedError
+
+    def unpack_body(self, buffer, offset, size):
+        """Decode size bytes at offset, the field being a whole subrecord body"""
+        return self.transform(buffer[offset:offset + size])
 
     def __get__(self, instance, cls):
-        return self.transform(instance.buffer[self.offset])
+        if instance is None:
+            return self
+        layout = getattr(cls, '_layout', None)
+        if layout is not None:
+            i = layout.positions.get(self)
+            if i is not None:
+                return instance.unpack_fields()[i]
+        source = getattr(instance, 'struct_source', None)
+        if source is None:
+            return self.transform(instance.buffer[self.offset])
+        buffer, base = source()
+        offset = self.offset
+        return self.transform(buffer[base + offset.start: base + offset.stop])
 
     def __getitem__(self, offset):
         self.offset = offset
         return self
 
 
+_int_formats = {1: 'B', 2: 'H', 4: 'L', 8: 'Q'}
+
+
+def format_codes(fmt):
+    """
+    The struct code of every value a format unpacks to, pad bytes left
+    out and repeat counts expanded ('<f3xL' -> ['f', 'L'], '4s' -> ['4s'])
+    """
+    codes = []
+    count = ''
+    for char in fmt.lstrip('<>!=@'):
+        if char.isdigit():
+            count += char
+        elif char == 'x':
+            count = ''
+        elif char in 'sp':
+            codes.append((count or '1') + char)
+            count = ''
+        else:
+            codes.extend(char * int(count or 1))
+            count = ''
+    return codes
+
+
+def format_offsets(fmt):
+    """
+    The byte offset of every value a little-endian format unpacks to
+    ('<B3xfL' -> [0, 4, 8])
+    """
+    offsets = []
+    offset = 0
+    count = ''
+    for char in fmt.lstrip('<>!=@'):
+        if char.isdigit():
+            count += char
+        elif char == 'x':
+            offset += int(count or 1)
+            count = ''
+        elif char in 'sp':
+            offsets.append(offset)
+            offset += int(count or 1)
+            count = ''
+        else:
+            size = struct.calcsize('<' + char)
+            for _ in range(int(count or 1)):
+                offsets.append(offset)
+                offset += size
+            count = ''
+    return offsets
+
+
 class FixStrField(StructField):
     def transform(self, buffer):
         return buffer.tobytes().decode('latin1')
 
+    @property
+    def fmt(self):
+        return '%ds' % self.width
+
+    def convert(self, values):
+        return values[0].decode('latin1')
+
 
 class ULongField(StructField):
     def __init__(self, int_type=None):
@@ -57,14 +151,97 @@ class ULongField(StructField):
             val = self._int_type(val)
         return val
 
+    @property
+    def fmt(self):
+        return _int_formats.get(self.width)
+
+    def convert(self, values):
+        val = values[0]
+        if self._int_type:
+            val = self._int_type(val)
+        return val
+
 
 class NamedTupleField(StructField):
-    def __init__(self, struct_fmt, name, fields):
-        self._struct_fmt = struct_fmt
+    def __init__(self, struct_fmt, name, fields, formid_fields=()):
+        """formid_fields names the fields holding FormID references"""
+        self._struct = struct.Struct(struct_fmt)
         self._namedtuple = namedtuple(name, fields)
+        self.formid_fields = tuple(formid_fields)
 
     def transform(self, buffer):
-        return self._namedtuple(*struct.unpack_from(self._struct_fmt, buffer))
+        return self._namedtuple._make(self._struct.unpack_from(buffer))
+
+    @property
+    def fmt(self):
+        if self._struct.size != self.width:
+            return None
+        return self._struct.format.lstrip('<>!=@')
+
+    def convert(self, values):
+        return self._namedtuple._make(values)
+
+    @property
+    def struct(self):
+        return self._struct
+
+    @property
+    def fields(self):
+        return self._namedtuple._fields
+
+    @property
+    def formid_offsets(self):
+        """Byte offsets of the formid_fields in the body"""
+        offsets = format_offsets(self._struct.format)
+        return tuple(offsets[self.fields.index(name)] for name in self.formid_fields)
+
+    def unpack_body(self, buffer, offset, size):
+        if size < self._struct.size:
+            raise struct.error('%d bytes is too short for %s' % (
+                size, self._namedtuple.__name__))
+        return self._namedtuple._make(self._struct.unpack_from(buffer, offset))
+
+
+class ScalarField(StructField):
+    """A single value of any struct format"""
+    def __init__(self, struct_fmt):
+        self._struct = struct.Struct(struct_fmt)
+
+    def transform(self, buffer):
+        return self._struct.unpack_from(buffer)[0]
+
+    @property
+    def fmt(self):
+        if self._struct.size != self.width:
+            return None
+        return self._struct.format.lstrip('<>!=@')
+
+    def convert(self, values):
+        return values[0]
+
+    @property
+    def struct(self):
+        return self._struct
+
+    def unpack_body(self, buffer, offset, size):
+        if size < self._struct.size:
+            raise struct.error('%d bytes is too short for %s' % (
+                size, self._struct.format))
+        return self._struct.unpack_from(buffer, offset)[0]
+
+
+class FormIdField(ScalarField):
+    """A FormID reference to another record"""
+    formid_offsets = (0,)
+
+    def __init__(self):
+        super().__init__('<L')
+
+
+class ZStringField(StructField):
+    """A NUL terminated latin1 string filling the rest of the buffer"""
+    def transform(self, buffer):
+        return bytes(buffer).split(b'\0', 1)[0].decode('latin1')
 
 
 class FlagsField(StructField):
@@ -73,4 +250,100 @@ class FlagsField(StructField):
 
     def transform(self, buffer):
         val = int.from_bytes(buffer, 'little', signed=False)
-        return Flags(val, self._flags)
\ No newline at end of file
+        return Flags(val, self._flags)
+
+    @property
+    def fmt(self):
+        return _int_formats.get(self.width)
+
+    def convert(self, values):
+        return Flags(values[0], self._flags)
+
+    def mask(self, *names):
+        mask = 0
+        for name in names:
+            mask |= self._flags[name]
+        return mask
+
+
+class StructLayout:
+    """
+    The fields of a class compiled into one little-endian struct.Struct.
+
+    Fields are taken in declaration order; a field that overlaps one
+    already taken, can't be expressed as a struct format or lies past
+    the class' header_size is left out and decodes itself on access.
+    """
+    def __init__(self, fields):
+        fields = sorted(fields, key=lambda field: field.offset.start)
+        fmt = '<'
+        position = 0
+        slices = []
+        values = 0
+        for field in fields:
+            gap = field.offset.start - position
+            fmt += ('%dx' % gap if gap else '') + field.fmt
+            position = field.offset.stop
+            count = len(struct.unpack_from('<' + field.fmt, bytes(field.width)))
+            slices.append(slice(values, values + count))
+            values += count
+        self.struct = struct.Struct(fmt)
+        self.fields = fields
+        self.slices = slices
+        self.positions = {field: i for i, field in enumerate(fields)}
+
+    @classmethod
+    def compile(cls, owner):
+        limit = getattr(owner, 'header_size', None)
+        if not isinstance(limit, int):
+            limit = None
+        fields = {}
+        for klass in reversed(owner.__mro__):
+            for name, value in vars(klass).items():
+                if isinstance(value, StructField) and value.offset is not None:
+                    fields[name] = value
+        taken = []
+        for field in fields.values():
+            if field.fmt is None:
+                continue
+            if limit is not None and field.offset.stop > limit:
+                continue
+            if any(field.offset.start < other.offset.stop and
+                   other.offset.start < field.offset.stop for other in taken):
+                continue
+            taken.append(field)
+        return cls(taken) if taken else None
+
+    def unpack(self, buffer, offset=0):
+        values = self.struct.unpack_from(buffer, offset)
+        return tuple(
+            field.convert(values[s])
+            for field, s in zip(self.fields, self.slices)
+        )
+
+
+class CompiledStruct:
+    """
+    Mixin decoding all of a class' compilable StructFields with a single
+    unpack_from the first time any of them is read, caching the results
+    on the instance.
+    """
+    __slots__ = ()
+
+    _layout = None
+    _struct_values = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._layout = StructLayout.compile(cls)
+
+    def struct_source(self):
+        """(buffer, offset) the fields are relative to"""
+        return self.buffer, 0
+
+    def unpack_fields(self):
+        values = self._struct_values
+        if values is None:
+            values = self._struct_values = self._layout.unpack(
+                *self.struct_source())
+        return values
@@ -0,0 +1,177 @@
+"""
+Dialogue index: topics, their INFOs and the quests they belong to
+
+    dialogue = esm.dialogue_index
+    for info in dialogue.infos(topic):
+        record = Record(esm.view, info.offset)
+
+One pass over the DIAL top group pairs each topic_children group with
+its DIAL topic and records, per INFO, its QSTI quest and where its CTDA
+conditions and NAM1 responses are, so exports never walk the DIAL tree
+again. The INFOs of each topic, conditions and responses are flat
+arrays indexed CSR style.
+"""
+from array import array
+from collections import namedtuple
+import struct
+from .espesmformat import GroupType, record_body, scan_subrecords
+
+_header = struct.Struct('<4sLLL')
+_formid = struct.Struct('<L')
+
+# conditions and responses are subrecord offsets, as in
+# Record.subrecord_index: into the file, or into the inflated body of
+# compressed records. quest is 0 when the INFO has no QSTI.
+Info = namedtuple('Info', ['formid', 'offset', 'quest', 'conditions', 'responses'])
+
+
+def _formid_at(buffer, offset, size):
+    return _formid.unpack_from(buffer, offset + 6)[0] if size >= 4 else 0
+
+
+class _Lists:
+    """
+    Lists of integers per key 0, 1, ..., flattened CSR style: the list of
+    key i is values[starts[i]:starts[i + 1]]
+    """
+    def __init__(self):
+        self.starts = array('I', [0])
+        self.values = array('I')
+
+    @classmethod
+    def grouped(cls, keys, n):
+        """The positions in keys of each key in range(n), in order"""
+        lists = cls()
+        starts = lists.starts = array('I', bytes(4 * (n + 1)))
+        for key in keys:
+            starts[key + 1] += 1
+        for i in range(n):
+            starts[i + 1] += starts[i]
+        values = lists.values = array('I', bytes(4 * len(keys)))
+        fill = starts[:-1]
+        for position, key in enumerate(keys):
+            values[fill[key]] = position
+            fill[key] += 1
+        return lists
+
+    def append(self, values):
+        self.values.extend(values)
+        self.starts.append(len(self.values))
+
+    def __getitem__(self, i):
+        return self.values[self.starts[i]:self.starts[i + 1]].tolist()
+
+
+class DialogueIndex:
+    def __init__(self):
+        self.topics = array('I')  # topic FormIDs in file order
+        self.topic_offsets = array('I')
+        self._topic_index = {}  # topic FormID -> position in topics
+        self._topic_quests = _Lists()
+        self._topic_infos = _Lists()  # topic position -> info positions
+
+        self.info_formids = array('I')
+        self.info_offsets = array('I')
+        self.info_quests = array('I')
+        self.info_topics = array('I')  # topic position of each INFO
+        self._conditions = _Lists()
+        self._responses = _Lists()
+        self._info_index = {}  # INFO FormID -> position
+
+        self._quest_topics = {}  # quest FormID -> [topic FormID, ...]
+
+    @classmethod
+    def build(cls, buffer, start, end, plugin=None):
+        index = cls()
+        topic = None  # position of the topic whose children we are in
+        topic_end = start
+        offset = start
+        while offset < end:
+            if offset >= topic_end:
+                topic = None
+            type, size, flags, formid = _header.unpack_from(buffer, offset)
+            if type == b'GRUP':
+                # flags is the raw label and formid the group type
+                if formid == GroupType.topic_children:
+                    topic = index._topic_index.get(flags)
+                    topic_end = offset + size
+                offset += 20
+                continue
+            if type == b'DIAL':
+                index._add_topic(buffer, offset, formid, plugin)
+            elif type == b'INFO' and topic is not None:
+                index._add_info(buffer, offset, formid, topic, plugin)
+            offset += 20 + size
+        index._finish()
+        return index
+
+    def _add_topic(self, buffer, offset, formid, plugin):
+        buf, start, end = record_body(buffer, offset, plugin)
+        quests = [
+            _formid_at(buf, position, size)
+            for stype, position, size in scan_subrecords(buf, start, end)
+            if stype == b'QSTI'
+        ]
+        self._topic_index[formid] = len(self.topics)
+        self.topics.append(formid)
+        self.topic_offsets.append(offset)
+        self._topic_quests.append(quests)
+
+    def _add_info(self, buffer, offset, formid, topic, plugin):
+        quest = 0
+        conditions, responses = [], []
+        buf, start, end = record_body(buffer, offset, plugin)
+        for stype, position, size in scan_subrecords(buf, start, end):
+            if stype == b'QSTI':
+                quest = _formid_at(buf, position, size)
+            elif stype == b'CTDA':
+                conditions.append(position)
+            elif stype == b'NAM1':
+                responses.append(position)
+        self._info_index[formid] = len(self.info_formids)
+        self.info_formids.append(formid)
+        self.info_offsets.append(offset)
+        self.info_quests.append(quest)
+        self.info_topics.append(topic)
+        self._conditions.append(conditions)
+        self._responses.append(responses)
+
+    def _finish(self):
+        self._topic_infos = _Lists.grouped(self.info_topics, len(self.topics))
+        quest_topics = {}
+        for i, topic in enumerate(self.topics):
+            quests = set(self._topic_quests[i])
+            for info in self._topic_infos[i]:
+                if self.info_quests[info]:
+                    quests.add(self.info_quests[info])
+            for quest in quests:
+                quest_topics.setdefault(quest, []).append(topic)
+        self._quest_topics = quest_topics
+
+    def __len__(self):
+        return len(self.topics)
+
+    def __contains__(self, topic):
+        return topic in self._topic_index
+
+    def info(self, i):
+        return Info(
+            self.info_formids[i], self.info_offsets[i], self.info_quests[i],
+            self._conditions[i], self._responses[i])
+
+    def infos(self, topic):
+        """Infos of a topic FormID, in file order"""
+        position = self._topic_index[topic]
+        return [self.info(i) for i in self._topic_infos[position]]
+
+    def topic_of(self, info):
+        """The topic FormID of an INFO FormID"""
+        return self.topics[self.info_topics[self._info_index[info]]]
+
+    def topic_quests(self, topic):
+        """The QSTI quests of a topic FormID"""
+        return self._topic_quests[self._topic_index[topic]]
+
+    def quest_topics(self, quest):
+        """Topic FormIDs used by a quest, through the topic's or its INFOs' QSTI"""
+        return list(self._quest_topics.get(quest, ()))
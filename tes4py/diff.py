@@ -0,0 +1,150 @@
+"""
+Record-level differences between plugins
+
+    with EspEsmFormat('Mod-1.0.esp') as old, EspEsmFormat('Mod-1.1.esp') as new:
+        changes = diff(old, new)
+
+Records are paired through the FormID indexes. Each pair is first
+compared on its raw header fields and body bytes straight from the two
+maps; only bodies that differ as stored but are compressed get inflated,
+and only records that really differ are scanned subrecord by subrecord.
+vc_info (version control stamps) is ignored.
+"""
+from collections import namedtuple
+import struct
+from .espesmformat import COMPRESSED, Record
+
+_header = struct.Struct('<4sLL')
+_size = struct.Struct('<L')
+
+# added and removed are FormIDs, modified is a list of Changes, all in
+# FormID order
+PluginDiff = namedtuple('PluginDiff', ['added', 'removed', 'modified'])
+
+# flags is (old, new) raw flags without the compression bit, or None when
+# they are the same
+Change = namedtuple('Change', ['formid', 'type', 'flags', 'subrecords'])
+
+# the index-th subrecord of a type; old or new is None when it was added
+# or removed
+SubrecordChange = namedtuple('SubrecordChange', ['type', 'index', 'old', 'new'])
+
+
+def same_record(old_view, old_offset, new_view, new_offset):
+    """
+    Whether two records have the same type, flags and subrecord data,
+    whether or not they are stored compressed
+    """
+    old_type, old_size, old_flags = _header.unpack_from(old_view, old_offset)
+    new_type, new_size, new_flags = _header.unpack_from(new_view, new_offset)
+    if old_type != new_type or (old_flags ^ new_flags) & ~COMPRESSED:
+        return False
+    if old_size == new_size and (
+            old_view[old_offset + 20:old_offset + 20 + old_size].tobytes() ==
+            new_view[new_offset + 20:new_offset + 20 + new_size].tobytes()):
+        return True
+    if not (old_flags | new_flags) & COMPRESSED:
+        return False
+    old_body = Record(old_view, old_offset).body
+    new_body = Record(new_view, new_offset).body
+    return len(old_body) == len(new_body) and old_body.tobytes() == new_body.tobytes()
+
+
+def _values(record):
+    values = {}
+    for subrecord in record.subrecords:
+        values.setdefault(subrecord.type, []).append(subrecord.body_buffer.tobytes())
+    return values
+
+
+def subrecord_changes(old, new):
+    """SubrecordChanges between two Records, pairing subrecords by position"""
+    old_values, new_values = _values(old), _values(new)
+    types = list(old_values)
+    types += [type for type in new_values if type not in old_values]
+    changes = []
+    for type in types:
+        olds, news = old_values.get(type, []), new_values.get(type, [])
+        for index in range(max(len(olds), len(news))):
+            old_data = olds[index] if index < len(olds) else None
+            new_data = news[index] if index < len(news) else None
+            if old_data != new_data:
+                changes.append(SubrecordChange(type, index, old_data, new_data))
+    return changes
+
+
+def record_change(formid, old, new):
+    flags = None
+    old_flags = int(old.flags) & ~COMPRESSED
+    new_flags = int(new.flags) & ~COMPRESSED
+    if old_flags != new_flags:
+        flags = old_flags, new_flags
+    return Change(formid, new.type, flags, subrecord_changes(old, new))
+
+
+def diff(old, new):
+    """PluginDiff from the open plugin old to the open plugin new"""
+    old_index, new_index = old.formid_index, new.formid_index
+    old_formids, old_offsets = old_index.formids, old_index.offsets
+    new_formids, new_offsets = new_index.formids, new_index.offsets
+    old_view, new_view = old.view, new.view
+    unpack_size = _size.unpack_from
+    added, removed, modified = [], [], []
+    i = j = 0
+    n, m = len(old_formids), len(new_formids)
+    while i < n and j < m:
+        old_formid, new_formid = old_formids[i], new_formids[j]
+        if old_formid < new_formid:
+            removed.append(old_formid)
+            i += 1
+        elif new_formid < old_formid:
+            added.append(new_formid)
+            j += 1
+        else:
+            old_offset, new_offset = old_offsets[i], new_offsets[j]
+            i += 1
+            j += 1
+            # inline fast path for records stored identically: type, size,
+            # flags and body bytes, skipping formid and vc_info
+            end = old_offset + 20 + unpack_size(old_view, old_offset + 4)[0]
+            if (old_view[old_offset:old_offset + 12].tobytes() ==
+                    new_view[new_offset:new_offset + 12].tobytes() and
+                    old_view[old_offset + 20:end].tobytes() ==
+                    new_view[new_offset + 20:new_offset + end - old_offset].tobytes()):
+                continue
+            if not same_record(old_view, old_offset, new_view, new_offset):
+                modified.append(record_change(
+                    new_formid, Record(old_view, old_offset, old),
+                    Record(new_view, new_offset, new)))
+    removed.extend(old_formids[i:])
+    added.extend(new_formids[j:])
+    return PluginDiff(added, removed, modified)
+
+
+def identical_to_master(load_order, plugin_index):
+    """
+    Load order FormIDs of the records of a plugin in an open LoadOrder that
+    are identical to the override they replace (ITMs). Bodies are compared
+    as stored, so FormIDs inside them must use the same master indices.
+    """
+    plugin = load_order.plugins[plugin_index]
+    index = plugin.formid_index
+    indices = load_order.mod_indices(plugin_index)
+    last = len(indices) - 1
+    result = []
+    for formid, offset in zip(index.formids, index.offsets):
+        mod_index = indices[min(formid >> 24, last)]
+        if mod_index == plugin_index:
+            continue  # a new record, not an override
+        resolved = mod_index << 24 | formid & 0xFFFFFF
+        previous = None
+        for other, record in load_order.overrides(resolved):
+            if other is plugin:
+                break
+            previous = other, record
+        if previous is None:
+            continue
+        other, record = previous
+        if same_record(other.view, record.offset, plugin.view, offset):
+            result.append(resolved)
+    return result
@@ -0,0 +1,174 @@
+"""
+Editor ID index: exact, case-insensitive and prefix lookups in O(log n)
+
+The EDIDs of every record, nested ones included, are kept sorted
+case-insensitively in one latin1 byte string, with an array of start
+offsets into it and a parallel array of record offsets, so the index is
+three flat buffers that can be saved next to the plugin and mmapped back.
+"""
+from array import array
+from bisect import bisect_left
+import struct
+import zlib
+from .espesmformat import COMPRESSED, _subrecord_header, scan_subrecords
+from .index import IndexCache
+
+_header = struct.Struct('<4sLLL')
+
+
+def _first_edid(buffer, offset):
+    """The raw EDID of the record at offset, without the terminator, or None"""
+    type, size, flags, formid = _header.unpack_from(buffer, offset)
+    start = offset + 20
+    if flags & COMPRESSED:
+        # EDID comes first, so only the start of the body is inflated
+        inflate = zlib.decompressobj()
+        data = buffer[start + 4:start + size]
+        head = inflate.decompress(data, 6)
+        if len(head) < 6:
+            return None
+        stype, ssize = _subrecord_header.unpack(head)
+        if stype != b'EDID':
+            return None
+        value = inflate.decompress(inflate.unconsumed_tail, ssize)
+        return value.split(b'\0', 1)[0]
+    for stype, position, ssize in scan_subrecords(buffer, start, start + size):
+        if stype == b'EDID':
+            return buffer[position + 6:position + 6 + ssize].tobytes().split(b'\0', 1)[0]
+    return None
+
+
+class _Folded:
+    """Sequence view of the sorted names, case folded, for bisect"""
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        return self.index._raw(i).lower()
+
+
+class EdidIndex:
+    def __init__(self, names, starts, offsets):
+        self.names = names  # the EDIDs, concatenated in case-insensitive order
+        self.starts = starts  # n + 1 start offsets into names
+        self.offsets = offsets  # record offset of each EDID
+        self._folded = _Folded(self)
+
+    @classmethod
+    def build(cls, buffer, start, end, plugin=None):
+        # plugin is unused: compressed records only have the start of
+        # their body inflated, which is not worth caching
+        entries = []
+        offset = start
+        while offset < end:
+            type, size = _header.unpack_from(buffer, offset)[:2]
+            if type == b'GRUP':
+                offset += 20
+                continue
+            edid = _first_edid(buffer, offset)
+            if edid:
+                entries.append((edid.lower(), edid, offset))
+            offset += 20 + size
+        entries.sort()
+        names = bytearray()
+        starts = array('I', [0])
+        offsets = array('I')
+        for folded, edid, offset in entries:
+            names += edid
+            starts.append(len(names))
+            offsets.append(offset)
+        return cls(bytes(names), starts, offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _raw(self, i):
+        return bytes(self.names[self.starts[i]:self.starts[i + 1]])
+
+    def edid(self, i):
+        return self._raw(i).decode('latin1')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.edid(i)
+
+    def _range(self, folded):
+        """The index range of the entries equal to folded, case-insensitively"""
+        start = bisect_left(self._folded, folded)
+        end = start
+        while end < len(self) and self._folded[end] == folded:
+            end += 1
+        return start, end
+
+    def find(self, edid, case_sensitive=True):
+        """Record offset of an EDID, or None"""
+        raw = edid.encode('latin1')
+        start, end = self._range(raw.lower())
+        for i in range(start, end):
+            if not case_sensitive or self._raw(i) == raw:
+                return self.offsets[i]
+        return None
+
+    def __getitem__(self, edid):
+        offset = self.find(edid)
+        if offset is None:
+            raise KeyError(edid)
+        return offset
+
+    def get(self, edid, default=None):
+        offset = self.find(edid)
+        return default if offset is None else offset
+
+    def __contains__(self, edid):
+        return self.find(edid) is not None
+
+    def prefix(self, prefix, limit=None):
+        """(EDID, record offset) of the EDIDs starting with prefix, ignoring case"""
+        folded = prefix.encode('latin1').lower()
+        i = bisect_left(self._folded, folded)
+        n = len(self)
+        while i < n and (limit is None or limit > 0):
+            if not self._folded[i].startswith(folded):
+                break
+            yield self.edid(i), self.offsets[i]
+            i += 1
+            if limit is not None:
+                limit -= 1
+
+
+class EdidCache(IndexCache):
+    """
+    Sidecar file holding the EdidIndex of a plugin, next to the IndexCache.
+
+    Layout: a fixed header, the start offsets, the record offsets and the
+    names.
+    """
+    suffix = '.t4edid'
+    magic = b'T4ED'
+    version = 1
+    # magic, version, source size, source mtime_ns, fingerprint,
+    # number of EDIDs, length of the names
+    header = struct.Struct('<4sIQQ16sII')
+
+    def load(self, buffer, stack):
+        """The mapped EdidIndex if the sidecar matches buffer, else None"""
+        mapped = self._map(buffer, stack)
+        if mapped is None:
+            return None
+        view, (count, length) = mapped
+        start, end = self.header.size, self.header.size + (count + 1) * 4
+        starts = stack.enter_context(view[start:end].cast('I'))
+        start, end = end, end + count * 4
+        offsets = stack.enter_context(view[start:end].cast('I'))
+        names = stack.enter_context(view[end:end + length])
+        return EdidIndex(names, starts, offsets)
+
+    def save(self, buffer, index):
+        self._write(buffer, (len(index), len(index.names)), (
+            array('I', index.starts).tobytes(),
+            array('I', index.offsets).tobytes(),
+            index.names,
+        ))
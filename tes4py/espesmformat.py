@@ -7,11 +7,26 @@ Created on Sat Apr 18 15:44:59 2015
 import collections
 import collections.abc
 from enum import IntEnum
+from io import BytesIO
+import os
 from pathlib import Path
-from mmap import mmap
+import mmap as _mmap
+from mmap import mmap, ACCESS_READ, ACCESS_WRITE
 from .binutils import *
+from .index import FormIdIndex, HeaderTable, IndexCache
 import weakref
 import contextlib
+import zlib
+from .lru import ByteLRUCache
+from . import schema as _schema
+from .stats import Stats
+
+# bytes of inflated record bodies each plugin keeps, see Record.body
+DECOMPRESSION_CACHE_SIZE = 64 << 20
+
+_record_header = struct.Struct('<4sL')
+_subrecord_header = struct.Struct('<4sH')
+_extended_size = struct.Struct('<L')
 
 class SubItemGenerator:
     def __init__(self, child_factory):
@@ -20,15 +35,25 @@ class SubItemGenerator:
     def __get__(self, instance, cls):
         return instance.generate_subitems(self.child_factory())
 
-class BaseRecord:
+class BaseRecord(CompiledStruct):
+    __slots__ = ('_buffer', '_offset', '_struct_values', '_plugin', '_stats')
+
     # properties must implement
     header_size = None
     total_size = None
     size = None
 
-    def __init__(self, buffer, offset):
+    def __init__(self, buffer, offset, plugin=None):
+        """plugin: the EspEsmFormat the node belongs to, if any"""
         self._buffer = buffer
         self._offset = offset
+        self._struct_values = None
+        self._plugin = plugin
+        # the Stats of the plugin while it is open, resolved once per node
+        self._stats = None if plugin is None else plugin._stats
+
+    def struct_source(self):
+        return self._buffer, self._offset
 
     @property
     def buffer(self):
@@ -38,50 +63,224 @@ class BaseRecord:
     def body_buffer(self):
         return self._buffer[self._offset + self.header_size: self._offset + self.total_size]
 
+    def _subitems_span(self):
+        return self._buffer, self._offset + self.header_size, self.size
+
     def generate_subitems(self, factory):
-        buf = self._buffer
-        size = self.size
+        if self._stats is not None:
+            yield from self._counted_subitems(factory, self._stats)
+            return
+        buf, start, size = self._subitems_span()
+        plugin = self._plugin
         bytes_consumed = 0
-        factory = factory
         while bytes_consumed < size:
-            child = factory(buf, self._offset + self.header_size + bytes_consumed)
+            child = factory(buf, start + bytes_consumed, plugin)
             yield child
             bytes_consumed += child.total_size
 
+    def _counted_subitems(self, factory, stats):
+        buf, start, size = self._subitems_span()
+        plugin = self._plugin
+        objects = stats.objects
+        bytes_consumed = 0
+        while bytes_consumed < size:
+            child = factory(buf, start + bytes_consumed, plugin)
+            objects[type(child).__name__] += 1
+            yield child
+            bytes_consumed += child.total_size
+        stats.count('bytes_scanned', bytes_consumed)
+
+    def generate_cursor(self, cls):
+        """
+        Like generate_subitems, but yields one instance of cls that is moved
+        from child to child instead of allocating a new one per child.
+
+        The yielded object is only valid until the next step; keep its
+        offset rather than the object itself.
+        """
+        buf, start, size = self._subitems_span()
+        end = start + size
+        plugin = self._plugin
+        child = cls.__new__(cls)
+        offset = start
+        while offset < end:
+            child.__init__(buf, offset, plugin)
+            yield child
+            offset += child.total_size
+
+    @property
+    def offset(self):
+        return self._offset
+
+_advice = {
+    'normal': 'MADV_NORMAL',
+    'sequential': 'MADV_SEQUENTIAL',
+    'random': 'MADV_RANDOM',
+    'willneed': 'MADV_WILLNEED',
+    'dontneed': 'MADV_DONTNEED',
+}
+
+
 class EspEsmFormat(BaseRecord, collections.abc.Mapping):
-    def __init__(self, vieworpath = None):
-        if isinstance(vieworpath, memoryview):
-            self.view = vieworpath
-        else:
+    def __init__(self, vieworpath = None, index_cache = None, writable = False,
+                 access = None, stats = None):
+        """
+        vieworpath: a path, opened and mmapped on __enter__, or an in-memory
+        source (bytes, bytearray, memoryview, mmap, BytesIO), usable right
+        away. Every __enter__ makes a fresh view over an in-memory source
+        and __exit__ releases it, so the source can be resized or closed
+        afterwards and the plugin entered again.
+
+        index_cache: None to always scan the file, True to keep a sidecar
+        index next to the plugin, or a directory to keep it in.
+
+        writable: map the file read-write instead of read-only.
+
+        access: madvise hint applied to the whole file on open, see advise.
+
+        stats: True or a tes4py.stats.Stats to instrument parsing while the
+        plugin is open, see self.stats.
+        """
+        self.stats = Stats() if stats is True else stats
+        self._stats = None  # self.stats while the plugin is open
+        self.path = None
+        self.index_cache = index_cache
+        self.writable = writable
+        self.access = access
+        self._file = None
+        self._mmap = None
+        self._source = None
+        # inflated bodies of this plugin's compressed records, by offset
+        self.decompression_cache = ByteLRUCache(DECOMPRESSION_CACHE_SIZE)
+        if isinstance(vieworpath, (str, os.PathLike)):
             path = vieworpath
             self.path = path if isinstance(path, Path) else Path(str(path))
+        else:
+            if isinstance(vieworpath, mmap):
+                self._mmap = vieworpath
+            self._source = vieworpath
+            self._attach(self._source_view())
+
+    def _source_view(self):
+        """A new view over the in-memory source"""
+        if isinstance(self._source, BytesIO):
+            return self._source.getbuffer()
+        return memoryview(self._source)
+
+    def _attach(self, view):
+        self.view = view
+        self.header_size = self.header.total_size
+        self.total_size = len(view)
+        self.size = len(view) - self.header_size
         self._num_groups = None
         self._groups_cache = None
+        self._formid_index = None
+        self._header_table = None
+        self._edid_index = None
+        self._text_index = None
+        self._reference_graph = None
+        self._spatial_index = None
+        self._dialogue_index = None
 
     def __enter__(self):
         self._exit_stack = stack = contextlib.ExitStack()
-        self._file = f = stack.enter_context(self.path.open("r+b"))
-        self._mmap = mm = stack.enter_context(mmap(f.fileno(), 0))
-        self.view = stack.enter_context(memoryview(mm))
-        self.header_size = self.header.total_size
-        self.total_size = len(self.view)
-        self.size = len(self.view) - self.header_size
-        self._groups_cache = None
+        if self.stats is not None:
+            self._start_stats(stack)
+            with self.stats.phase('open'):
+                return self._open(stack)
+        return self._open(stack)
+
+    def _start_stats(self, stack):
+        self._stats = self.stats
+        self.stats.start(self.decompression_cache)
+
+        def stop():
+            self._stats = None
+            self.stats.stop()
+        stack.callback(stop)
+
+    def _open(self, stack):
+        if self.path is None:
+            self._attach(stack.enter_context(self._source_view()))
+            return self
+        if self.writable:
+            mode, access = 'r+b', ACCESS_WRITE
+        else:
+            mode, access = 'rb', ACCESS_READ
+        self._file = f = stack.enter_context(self.path.open(mode))
+        self._mmap = mm = stack.enter_context(mmap(f.fileno(), 0, access=access))
+        self._attach(stack.enter_context(memoryview(mm)))
+        if self.access:
+            self.advise(self.access)
+        if self.index_cache:
+            self._load_index_cache(stack)
         return self
 
+    def advise(self, advice, start=0, length=None):
+        """
+        Pass an access pattern hint for a byte range to the kernel:
+        'sequential' before full scans, 'random' for index lookups,
+        'willneed' to prefetch a range. Does nothing for in-memory sources
+        or where madvise is not available.
+        """
+        mm = self._mmap
+        if mm is None or not hasattr(mm, 'madvise'):
+            return
+        flag = getattr(_mmap, _advice[advice], None)
+        if flag is None:
+            return
+        if length is None:
+            length = self.total_size - start
+        aligned = start - start % _mmap.PAGESIZE
+        mm.madvise(flag, aligned, length + start - aligned)
+
+    def prefetch(self, group):
+        """Ask the kernel to read a group's bytes in ahead of use"""
+        self.advise('willneed', group.offset, group.total_size)
+
+    def _load_index_cache(self, stack):
+        cache = IndexCache(
+            self.path, None if self.index_cache is True else self.index_cache)
+        loaded = cache.load(self.view, stack)
+        if loaded is not None:
+            if self._stats is not None:
+                self._stats.count('index_cache_hits')
+            self._header_table, self._formid_index = loaded
+            return
+        if self._stats is not None:
+            self._stats.count('index_cache_misses')
+        self._formid_index = FormIdIndex.from_table(self.header_table)
+        try:
+            cache.save(self.view, self._header_table, self._formid_index)
+        except OSError:
+            pass  # the cache is only an optimization
+
     def __exit__(self, *args, **kwargs):
         #del self.view
         #del self._mmap
         #del self._file
+        self.decompression_cache.clear()
         self._exit_stack.close()
 
     @property
     def _buffer(self):
         return self.view
 
+    @property
+    def _plugin(self):
+        return self
+
     @property
     def header(self):
-        return Record(self.view, 0)
+        return Record(self.view, 0, self)
+
+    @property
+    def masters(self):
+        """File names of the masters listed in the TES4 header, in order"""
+        return [
+            subrecord.zstring for subrecord in self.header.subrecords
+            if subrecord.type == 'MAST'
+        ]
 
     @property
     def buffer(self):
@@ -96,15 +295,200 @@ class EspEsmFormat(BaseRecord, collections.abc.Mapping):
     @property
     def groups(self):
         if self._groups_cache is None:
-            self._groups_cache = [
-                g for g in self._groups
-                if g.label not in ('WRLD', 'CELL', 'DIAL')
-                # exclude irregular groups for now
-            ]
+            self._groups_cache = list(self._top_groups())
         return self._groups_cache
 
     _groups = SubItemGenerator(lambda: Group)
 
+    def _top_groups(self):
+        if self._header_table is None:
+            return self._groups
+        return (
+            Group(self.view, entry.offset, self) for entry in self._header_table
+            if entry.depth == 0 and entry.type == b'GRUP'
+        )
+
+    @property
+    def header_table(self):
+        if self._header_table is None:
+            stats = self._stats
+            if stats is not None:
+                with stats.phase('header_table'):
+                    self._header_table = self._counted_header_table(stats)
+            else:
+                self._header_table = HeaderTable.build(
+                    self.view, self.header_size, self.total_size)
+        return self._header_table
+
+    def _counted_header_table(self, stats):
+        """Build the header table one top group at a time, reporting progress"""
+        start, end = self.header_size, self.total_size
+        data = bytearray()
+        for group in self._groups:
+            offset = group.offset
+            data += HeaderTable.build(self.view, offset, offset + group.total_size).data
+            stats.progress('header_table', offset + group.total_size - start, end - start)
+        stats.count('bytes_scanned', end - start)
+        stats.objects['HeaderTable'] += 1
+        return HeaderTable(data)
+
+    def scan_parallel(self, processes=None):
+        """
+        Build the header table and FormID index with a process pool. The
+        workers map the file themselves, so in-memory sources are scanned
+        serially instead.
+        """
+        if self.path is None:
+            self._header_table = HeaderTable.build(
+                self.view, self.header_size, self.total_size)
+        else:
+            from . import parallel
+            self._header_table = parallel.header_table(self.path, processes)
+        self._formid_index = FormIdIndex.from_table(self._header_table)
+        self._groups_cache = None
+
+    def table(self):
+        """The header table as a NumPy structured array (needs numpy)"""
+        from .table import header_array
+        return header_array(self.header_table)
+
+    def edit(self):
+        """A PluginWriter collecting record edits, see tes4py.writer"""
+        from .writer import PluginWriter
+        return PluginWriter(self)
+
+    def query(self, type=None, flags=None, formid=None, group=None, where=None,
+              memoize=False):
+        """Generator of matching Records, see tes4py.query"""
+        from .query import query
+        return query(self, type, flags, formid, group, where, memoize)
+
+    def diff(self, other):
+        """PluginDiff from this plugin to the open plugin other, see tes4py.diff"""
+        from .diff import diff
+        return diff(self, other)
+
+    def extract(self, record_type, columns, dataframe=False, schema=None):
+        """Typed columns of subrecord fields, see tes4py.extract (needs numpy)"""
+        from .extract import extract
+        return extract(self, record_type, columns, dataframe, schema)
+
+    @property
+    def formid_index(self):
+        if self._formid_index is None:
+            stats = self._stats
+            if stats is not None:
+                with stats.phase('formid_index'):
+                    self._formid_index = FormIdIndex.build(
+                        self.view, self.header_size, self.total_size)
+                stats.count('bytes_scanned', self.size)
+            else:
+                self._formid_index = FormIdIndex.build(
+                    self.view, self.header_size, self.total_size)
+        return self._formid_index
+
+    def by_formid(self, formid):
+        stats = self._stats
+        if stats is not None:
+            stats.count('formid_lookups')
+            stats.objects['Record'] += 1
+        return Record(self.view, self.formid_index[formid], self)
+
+    def _cached_index(self, cache_class, index_class):
+        """
+        Load an index from its sidecar when index_cache is set, else build
+        it and try to save it there
+        """
+        cache = None
+        if self.index_cache and self.path is not None:
+            cache = cache_class(
+                self.path, None if self.index_cache is True else self.index_cache)
+            index = cache.load(self.view, self._exit_stack)
+            if index is not None:
+                return index
+        index = index_class.build(
+            self.view, self.header_size, self.total_size, plugin=self)
+        if cache is not None:
+            try:
+                cache.save(self.view, index)
+            except OSError:
+                pass  # the cache is only an optimization
+        return index
+
+    @property
+    def edid_index(self):
+        """EDID -> record offset, see tes4py.edid; kept in the index cache"""
+        if self._edid_index is None:
+            from .edid import EdidCache, EdidIndex
+            self._edid_index = self._cached_index(EdidCache, EdidIndex)
+        return self._edid_index
+
+    @property
+    def text_index(self):
+        """Inverted index of FULL, DESC and NAM1, see tes4py.textindex"""
+        if self._text_index is None:
+            from .textindex import TextIndexCache, TextIndex
+            self._text_index = self._cached_index(TextIndexCache, TextIndex)
+        return self._text_index
+
+    @property
+    def reference_graph(self):
+        """FormID references both ways, see tes4py.refs"""
+        if self._reference_graph is None:
+            from .refs import ReferenceGraph
+            self._reference_graph = ReferenceGraph.build(
+                self.view, self.header_size, self.total_size, plugin=self)
+        return self._reference_graph
+
+    @property
+    def spatial_index(self):
+        """Worldspace FormID -> WorldIndex of its references, see tes4py.spatial"""
+        if self._spatial_index is None:
+            from .spatial import SpatialIndex
+            try:
+                group = self['WRLD']
+            except KeyError:
+                start = end = self.total_size
+            else:
+                start, end = group.offset, group.offset + group.total_size
+            self._spatial_index = SpatialIndex.build(self.view, start, end, plugin=self)
+        return self._spatial_index
+
+    @property
+    def dialogue_index(self):
+        """DIAL topics, their INFOs and quests, see tes4py.dialogue"""
+        if self._dialogue_index is None:
+            from .dialogue import DialogueIndex
+            try:
+                group = self['DIAL']
+            except KeyError:
+                start = end = self.total_size
+            else:
+                start, end = group.offset, group.offset + group.total_size
+            self._dialogue_index = DialogueIndex.build(self.view, start, end, plugin=self)
+        return self._dialogue_index
+
+    def references(self, formid):
+        """FormIDs the record formid references, sorted"""
+        return self.reference_graph.references[formid]
+
+    def referenced_by(self, formid):
+        """FormIDs of the records referencing formid, sorted"""
+        return self.reference_graph.referenced_by[formid]
+
+    def by_edid(self, edid, case_sensitive=True):
+        offset = self.edid_index.find(edid, case_sensitive)
+        if offset is None:
+            raise KeyError(edid)
+        return Record(self.view, offset, self)
+
+    def walk(self, enter=None):
+        records = walk(self.view, self.header_size, self.total_size, enter,
+                       plugin=self)
+        if self._stats is not None:
+            return _counted_walk(records, self._stats, self.header_size, self.total_size)
+        return records
+
     def __iter__(self):
         for group in self.groups:
             yield group.label
@@ -138,10 +522,72 @@ class GroupType(IntEnum):
     cell_visible_distant_children=10
 
 
+def record_or_group(buffer, offset, plugin=None):
+    if _record_header.unpack_from(buffer, offset)[0] == b'GRUP':
+        return Group(buffer, offset, plugin)
+    return Record(buffer, offset, plugin)
+
+
+def walk(buffer, start, end, enter=None, path=(), plugin=None):
+    """
+    Yield (path, record) for every record between start and end, path being
+    the tuple of Groups enclosing the record, outermost first.
+
+    enter(group, path) is asked before descending into each group; when it
+    returns False the whole subtree is skipped by jumping over its
+    total_size, without looking at any of its headers.
+    """
+    base = path
+    stack = []  # (end, path) of the groups we are inside of
+    offset = start
+    while offset < end:
+        while stack and offset >= stack[-1][0]:
+            stack.pop()
+            path = stack[-1][1] if stack else base
+        if _record_header.unpack_from(buffer, offset)[0] == b'GRUP':
+            group = Group(buffer, offset, plugin)
+            if enter is None or enter(group, path):
+                path = path + (group,)
+                stack.append((offset + group.total_size, path))
+                offset += group.header_size
+            else:
+                offset += group.total_size
+        else:
+            record = Record(buffer, offset, plugin)
+            yield path, record
+            offset += record.total_size
+
+
+def _counted_walk(records, stats, start, end):
+    """
+    Count the nodes yielded by walk and report progress at each top level
+    group
+    """
+    objects = stats.objects
+    previous = ()
+    offset = start
+    with stats.phase('walk'):
+        for path, record in records:
+            if path is not previous:
+                if path and (not previous or path[0] is not previous[0]):
+                    stats.progress('walk', path[0].offset - start, end - start)
+                objects['Group'] += sum(
+                    1 for i, group in enumerate(path)
+                    if i >= len(previous) or group is not previous[i])
+                previous = path
+            objects['Record'] += 1
+            offset = record.offset + record.total_size
+            yield path, record
+    stats.count('bytes_scanned', offset - start)
+    stats.progress('walk', end - start, end - start)
+
+
 class Group(BaseRecord):
-    def __init__(self, buffer, offset):
-        super().__init__(buffer, offset)
-        type, total_size = struct.unpack_from('<4sL', buffer[offset:])
+    __slots__ = ('type', 'total_size', 'size', '_records_cache')
+
+    def __init__(self, buffer, offset, plugin=None):
+        super().__init__(buffer, offset, plugin)
+        type, total_size = _record_header.unpack_from(buffer, offset)
         self.type = type.decode('latin1')
         self.total_size = total_size
         self.size = total_size - self.header_size
@@ -153,21 +599,62 @@ class Group(BaseRecord):
     group_type = ULongField(GroupType)[12:16]
     stamp = ULongField[16:20]
 
+    # the label is only a record type for top groups, otherwise it is
+    # the parent's formid, a block number or grid coordinates
+    parent_formid = ULongField[8:12]
+    block = NamedTupleField('<l', 'Block', ['number'])[8:12]
+    grid = NamedTupleField('<hh', 'Grid', ['y', 'x'])[8:12]
+
+    @property
+    def key(self):
+        group_type = self.group_type
+        if group_type == GroupType.top:
+            return self.label
+        elif group_type in (GroupType.interior_cell_block,
+                            GroupType.interior_cell_subblock):
+            return self.block.number
+        elif group_type in (GroupType.exterior_cell_block,
+                            GroupType.exterior_cell_subblock):
+            return self.grid
+        else:
+            return self.parent_formid
+
     @property
     def records(self):
         if self._records_cache is None:
-            self._records_cache = list(self._records)
+            self._records_cache = [
+                child for child in self.children if isinstance(child, Record)
+            ]
         return self._records_cache
 
-    _records = SubItemGenerator(lambda: Record)
-    groups = SubItemGenerator(lambda: Group)
+    @property
+    def groups(self):
+        for child in self.children:
+            if isinstance(child, Group):
+                yield child
+
+    children = SubItemGenerator(lambda: record_or_group)
+
+    def record_cursor(self):
+        """Flyweight iteration over a group holding only records"""
+        return self.generate_cursor(Record)
+
+    def walk(self, enter=None):
+        return walk(
+            self._buffer, self._offset + self.header_size,
+            self._offset + self.total_size, enter, (self,), self._plugin)
 
 
 class Record(BaseRecord, collections.abc.Mapping):
-    def __init__(self, buffer, offset):
-        super().__init__(buffer, offset)
+    __slots__ = ('type', 'size', 'total_size', '_num_subrecords', '_subrecord_index',
+                 '_body')
+
+    def __init__(self, buffer, offset, plugin=None):
+        super().__init__(buffer, offset, plugin)
         self._num_subrecords = None
-        type, size = struct.unpack_from('<4sL', buffer[offset:])
+        self._subrecord_index = None
+        self._body = None
+        type, size = _record_header.unpack_from(buffer, offset)
         self.type = type.decode('latin1')
         self.size = size
         self.total_size = size + self.header_size
@@ -194,7 +681,102 @@ class Record(BaseRecord, collections.abc.Mapping):
     formid = ULongField[12:16]
     vc_info = NamedTupleField('<BBH', 'VCInfo', ['day', 'month', 'owner'])[16:20]
 
-    subrecords = SubItemGenerator(lambda: SubRecord)
+    def _scan_subrecords(self):
+        """
+        Yield (buffer, offset, size) of every subrecord. An XXXX subrecord
+        holds the size of the following one, whose own size field is 0;
+        it is folded into that subrecord instead of being yielded.
+        """
+        buf, start, size = self._subitems_span()
+        if self._stats is not None:
+            self._stats.count('subrecord_scans')
+            self._stats.count('bytes_scanned', size)
+        for type, offset, size in scan_subrecords(buf, start, start + size):
+            yield buf, offset, size
+
+    @property
+    def subrecords(self):
+        plugin = self._plugin
+        if self._stats is not None:
+            objects = self._stats.objects
+            for buf, offset, size in self._scan_subrecords():
+                objects['SubRecord'] += 1
+                yield SubRecord(buf, offset, size, plugin)
+            return
+        for buf, offset, size in self._scan_subrecords():
+            yield SubRecord(buf, offset, size, plugin)
+
+    def subrecord_cursor(self):
+        """Flyweight iteration over the subrecords, see generate_cursor"""
+        plugin = self._plugin
+        child = SubRecord.__new__(SubRecord)
+        for buf, offset, size in self._scan_subrecords():
+            child.__init__(buf, offset, size, plugin)
+            yield child
+
+    @property
+    def subrecord_index(self):
+        """Subrecord type -> [(offset, size), ...] in file order"""
+        if self._subrecord_index is None:
+            index = {}
+            for buf, offset, size in self._scan_subrecords():
+                type = _subrecord_header.unpack_from(buf, offset)[0]
+                index.setdefault(type.decode('latin1'), []).append((offset, size))
+            self._subrecord_index = index
+        return self._subrecord_index
+
+    def decoded(self, schema=None):
+        """All subrecords decoded through the schema registry, see Schema"""
+        return (schema or _schema.schema).decode(self)
+
+    def getall(self, key):
+        """Every subrecord of type key, in file order"""
+        locations = self.subrecord_index.get(key)
+        if self._stats is not None:
+            self._stats.count('subrecord_lookups')
+            self._stats.objects['SubRecord'] += len(locations or ())
+        if not locations:
+            return []
+        buf, plugin = self._subitems_span()[0], self._plugin
+        return [SubRecord(buf, offset, size, plugin) for offset, size in locations]
+
+    @property
+    def body(self):
+        """
+        The subrecord data, inflated first if the record is compressed.
+        Inflated bodies are shared through the plugin's decompression_cache,
+        or kept by the record itself when it has no plugin.
+        """
+        if not self.flags.is_compressed:
+            return self.body_buffer
+        if self._plugin is None:
+            if self._body is None:
+                self._body = self._inflate()
+            return self._body
+        cache = self._plugin.decompression_cache
+        body = cache.get(self._offset)
+        if body is None:
+            if self._stats is not None:
+                with self._stats.phase('decompress'):
+                    body = self._inflate()
+                self._stats.count('decompressions')
+                self._stats.count('decompressed_bytes', len(body))
+            else:
+                body = self._inflate()
+            cache.put(self._offset, body)
+        return body
+
+    def _inflate(self):
+        raw = self.body_buffer
+        body = memoryview(zlib.decompress(raw[4:]))
+        assert len(body) == int.from_bytes(raw[:4], 'little')
+        return body
+
+    def _subitems_span(self):
+        if self.flags.is_compressed:
+            body = self.body
+            return body, 0, len(body)
+        return super()._subitems_span()
 
     def __iter__(self):
         for subrecords in self.subrecords:
@@ -209,28 +791,76 @@ class Record(BaseRecord, collections.abc.Mapping):
         return self._num_subrecords
 
     def __getitem__(self, key):
-        for subrecord in self.subrecords:
-            if subrecord.type == key:
-                return subrecord
-        raise KeyError(key)
+        if self._stats is not None:
+            self._stats.count('subrecord_lookups')
+        try:
+            offset, size = self.subrecord_index[key][0]
+        except KeyError:
+            raise KeyError(key) from None
+        if self._stats is not None:
+            self._stats.objects['SubRecord'] += 1
+        return SubRecord(self._subitems_span()[0], offset, size, self._plugin)
 
 class SubRecord(BaseRecord):
-    def __init__(self, buffer, offset):
-        super().__init__(buffer, offset)
-        type, size = struct.unpack_from('<4sH', buffer[offset:])
+    __slots__ = ('type', 'size', 'total_size')
+
+    def __init__(self, buffer, offset, size=None, plugin=None):
+        """size overrides the header's size, see Record._scan_subrecords"""
+        super().__init__(buffer, offset, plugin)
+        type, header_size = _subrecord_header.unpack_from(buffer, offset)
         self.type = type.decode('latin1')
-        self.size = size
-        self.total_size = size + self.header_size
+        self.size = header_size if size is None else size
+        self.total_size = self.size + self.header_size
 
     header_size = 6
 
     @property
     def zstring(self):
-        buf = self.body_buffer[:-1].tobytes()
-        assert self.body_buffer[-1] == 0
+        if self._stats is not None:
+            self._stats.count('zstrings')
+        start = self._offset + self.header_size
+        buf = self._buffer[start:start + self.size].tobytes()
+        assert buf[-1] == 0
+        buf = buf[:-1]
         assert b'\0' not in buf
         return buf.decode('latin1')
 
     formid = ULongField[header_size:header_size+4]
     item_data = NamedTupleField(
-        '<Lf', 'ItemData', ['gold_value', 'weight'])[header_size:header_size+8]
\ No newline at end of file
+        '<Lf', 'ItemData', ['gold_value', 'weight'])[header_size:header_size+8]
+
+# raw header flag of compressed records, for scans that skip Record
+COMPRESSED = Record.flags.mask('is_compressed')
+_record_flags = struct.Struct('<4sLL')
+
+
+def scan_subrecords(buffer, start, end):
+    """
+    Yield (raw type, offset, size) of the subrecords between start and end.
+    An XXXX subrecord holds the size of the following one, whose own size
+    field is 0; it is folded into that subrecord instead of being yielded,
+    and offset is that of the following subrecord's header.
+    """
+    unpack_from = _subrecord_header.unpack_from
+    offset = start
+    while offset < end:
+        type, size = unpack_from(buffer, offset)
+        if type == b'XXXX':
+            size = _extended_size.unpack_from(buffer, offset + 6)[0]
+            offset += 10
+            type = unpack_from(buffer, offset)[0]
+        yield type, offset, size
+        offset += 6 + size
+
+
+def record_body(buffer, offset, plugin=None):
+    """
+    (buffer, start, end) of the subrecords of the record at offset, the
+    inflated body for compressed records; a Record is only built for those,
+    sharing plugin's decompression cache when given
+    """
+    type, size, flags = _record_flags.unpack_from(buffer, offset)
+    if flags & COMPRESSED:
+        body = Record(buffer, offset, plugin).body
+        return body, 0, len(body)
+    return buffer, offset + 20, offset + 20 + size
@@ -0,0 +1,93 @@
+"""
+Streaming export of plugin records to JSON Lines or CSV
+
+Records are walked with generators, decoded, written and dropped one at a
+time, so memory use does not grow with the size of the plugin.
+"""
+import csv
+import json
+from .binutils import Flags
+
+BUFFER_SIZE = 1 << 20
+
+
+def jsonable(value):
+    """Decoded subrecord values as plain JSON types"""
+    if isinstance(value, tuple) and hasattr(value, '_asdict'):
+        return {key: jsonable(v) for key, v in value._asdict().items()}
+    elif isinstance(value, (list, tuple)):
+        return [jsonable(v) for v in value]
+    elif isinstance(value, dict):
+        return {key: jsonable(v) for key, v in value.items()}
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    elif isinstance(value, Flags):
+        return int(value)
+    return value
+
+
+def iter_rows(esm, groups=None, types=None, schema=None):
+    """
+    Yield one dict per record: formid, type, top group label, flags and
+    the decoded subrecords. groups and types restrict the top-level group
+    labels and record types; skipped groups are jumped over.
+    """
+    groups = set(groups) if groups else None
+    types = set(types) if types else None
+
+    def enter(group, path):
+        return groups is None or path or group.label in groups
+
+    for path, record in esm.walk(enter):
+        if types is not None and record.type not in types:
+            continue
+        yield {
+            'formid': record.formid,
+            'type': record.type,
+            'group': path[0].label if path else None,
+            'flags': int(record.flags),
+            'fields': jsonable(record.decoded(schema)),
+        }
+
+
+def write_jsonl(rows, f):
+    dumps = json.dumps
+    count = 0
+    for row in rows:
+        f.write(dumps(row, ensure_ascii=False))
+        f.write('\n')
+        count += 1
+    return count
+
+
+CSV_COLUMNS = ['formid', 'type', 'group', 'flags', 'edid', 'fields']
+
+
+def write_csv(rows, f):
+    writer = csv.writer(f)
+    writer.writerow(CSV_COLUMNS)
+    dumps = json.dumps
+    count = 0
+    for row in rows:
+        fields = row['fields']
+        writer.writerow([
+            '%08X' % row['formid'],
+            row['type'],
+            row['group'],
+            '%08X' % row['flags'],
+            fields.get('EDID', ''),
+            dumps(fields, ensure_ascii=False),
+        ])
+        count += 1
+    return count
+
+
+WRITERS = {
+    'jsonl': write_jsonl,
+    'csv': write_csv,
+}
+
+
+def export(esm, f, format='jsonl', groups=None, types=None, schema=None):
+    """Write every selected record of esm to the text file f, returns the count"""
+    return WRITERS[format](iter_rows(esm, groups, types, schema), f)
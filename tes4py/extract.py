@@ -0,0 +1,170 @@
+"""
+Columnar extraction of subrecord fields into NumPy arrays
+
+    esm.extract('CLOT', ['FULL', 'DATA.gold_value', 'DATA.weight'])
+
+walks the records of one type once and fills preallocated typed columns,
+without building Record objects or namedtuples for uncompressed records.
+"""
+import struct
+import numpy as np
+from .binutils import NamedTupleField, ScalarField, ZStringField, format_codes
+from .schema import schema as default_schema
+
+_record_header = struct.Struct('<4sLLL')
+
+_dtypes = {
+    'b': 'i1', 'B': 'u1', 'h': 'i2', 'H': 'u2', 'i': 'i4', 'I': 'u4',
+    'l': 'i4', 'L': 'u4', 'q': 'i8', 'Q': 'u8', 'f': 'f4', 'd': 'f8',
+    '?': 'bool',
+}
+
+
+class StringColumn:
+    """Strings stored as one latin1 byte buffer plus n + 1 offsets"""
+    def __init__(self, n):
+        self.offsets = np.zeros(n + 1, dtype=np.int64)
+        self.data = bytearray()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode('latin1')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def tolist(self):
+        return list(self)
+
+
+class _Column:
+    def __init__(self, name, subrecord_type, index, code, n):
+        self.name = name
+        self.subrecord_type = subrecord_type
+        self.index = index  # position in the unpacked tuple, None for strings
+        if code is None:
+            self.values = StringColumn(n)
+        else:
+            dtype = np.dtype(_dtypes[code])
+            missing = np.nan if dtype.kind == 'f' else 0
+            self.values = np.full(n, missing, dtype=dtype)
+
+
+def _columns(record_type, specs, n, schema):
+    columns = []
+    for spec in specs:
+        subrecord_type, _, attribute = spec.partition('.')
+        layout = schema.lookup(record_type, subrecord_type)
+        if layout is None:
+            raise ValueError('no layout for %s %s' % (record_type, subrecord_type))
+        field, repeated = layout
+        if isinstance(field, ZStringField) and not attribute:
+            index = code = None
+        elif isinstance(field, NamedTupleField) and attribute:
+            try:
+                index = field.fields.index(attribute)
+            except ValueError:
+                raise ValueError('%s %s has no field %s, only %s' % (
+                    record_type, subrecord_type, attribute,
+                    ', '.join(field.fields))) from None
+            code = format_codes(field.struct.format)[index]
+        elif isinstance(field, ScalarField) and not attribute:
+            index = 0
+            code = format_codes(field.struct.format)[0]
+        else:
+            raise ValueError('%s can not be extracted as a column' % spec)
+        if code is not None and code not in _dtypes:
+            raise ValueError('%s is not numeric' % spec)
+        columns.append(_Column(spec, subrecord_type, index, code, n))
+    return columns
+
+
+def _record_offsets(esm, record_type):
+    """Offsets of every record of a type, from its top group if it has one"""
+    type = record_type.encode('latin1')
+    try:
+        group = esm[record_type]
+    except KeyError:
+        start, end = esm.header_size, esm.total_size
+    else:
+        start, end = group.offset + group.header_size, group.offset + group.total_size
+    buffer = esm.view
+    unpack_from = _record_header.unpack_from
+    offsets = []
+    offset = start
+    while offset < end:
+        rtype, size, flags, formid = unpack_from(buffer, offset)
+        if rtype == b'GRUP':
+            offset += 20
+            continue
+        if rtype == type:
+            offsets.append(offset)
+        offset += 20 + size
+    return offsets
+
+
+def extract(esm, record_type, columns, dataframe=False, schema=None):
+    """
+    Dict of column -> values for every record of record_type, in file
+    order, plus a 'formid' column.
+
+    A column is a subrecord type with a string or scalar layout ('FULL',
+    'SCRI') or subrecord.field for struct layouts ('DATA.weight').
+    Numeric columns are NumPy arrays (NaN or 0 where the subrecord is
+    missing), string columns are StringColumns. With dataframe=True a
+    pandas DataFrame is returned instead.
+    """
+    from .espesmformat import record_body, scan_subrecords
+    schema = schema or default_schema
+    offsets = _record_offsets(esm, record_type)
+    n = len(offsets)
+    columns = _columns(record_type, columns, n, schema)
+    # raw subrecord type -> (struct or None, [column, ...])
+    wanted = {}
+    for column in columns:
+        field = schema.lookup(record_type, column.subrecord_type)[0]
+        unpacker = None if column.index is None else field.struct
+        wanted.setdefault(
+            column.subrecord_type.encode('latin1'), (unpacker, []))[1].append(column)
+
+    formids = np.zeros(n, dtype=np.uint32)
+    buffer = esm.view
+    unpack_record = _record_header.unpack_from
+    for i, offset in enumerate(offsets):
+        formids[i] = unpack_record(buffer, offset)[3]
+        buf, body_start, body_end = record_body(buffer, offset, esm)
+        seen = set()
+        for stype, position, ssize in scan_subrecords(buf, body_start, body_end):
+            if stype not in wanted or stype in seen:
+                continue
+            start = position + 6
+            seen.add(stype)
+            unpacker, targets = wanted[stype]
+            if unpacker is not None:
+                if ssize < unpacker.size:
+                    continue
+                values = unpacker.unpack_from(buf, start)
+            for column in targets:
+                if column.index is None:
+                    data = column.values.data
+                    text = bytes(buf[start:start + ssize]).split(b'\0', 1)[0]
+                    data += text
+                else:
+                    column.values[i] = values[column.index]
+        for column in columns:
+            if column.index is None:
+                column.values.offsets[i + 1] = len(column.values.data)
+
+    result = {'formid': formids}
+    for column in columns:
+        result[column.name] = column.values
+    if dataframe:
+        import pandas
+        return pandas.DataFrame({
+            name: values.tolist() if isinstance(values, StringColumn) else values
+            for name, values in result.items()
+        })
+    return result
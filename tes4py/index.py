@@ -0,0 +1,251 @@
+"""
+Flat, array-backed indexes over a plugin's records
+"""
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from hashlib import blake2b
+from mmap import mmap, ACCESS_READ
+from pathlib import Path
+import os
+import struct
+
+# type, size, flags (label for groups), formid (group type for groups)
+_header = struct.Struct('<4sLLL')
+_full_header = struct.Struct('<4sLLLL')
+
+NO_PARENT = 0xFFFFFFFF
+
+
+def iter_formids(buffer, start, end):
+    """
+    Yield (formid, offset) for every record between start and end.
+
+    Groups are not skipped but stepped into, so nested WRLD/CELL/DIAL
+    records are found without any recursion.
+    """
+    unpack_from = _header.unpack_from
+    offset = start
+    while offset < end:
+        type, size, flags, formid = unpack_from(buffer, offset)
+        if type == b'GRUP':
+            offset += 20
+        else:
+            yield formid, offset
+            offset += 20 + size
+
+
+Entry = namedtuple(
+    'Entry',
+    ['type', 'size', 'flags', 'formid', 'vc_info', 'offset', 'parent', 'depth'])
+
+
+class HeaderTable:
+    """
+    One fixed-size entry per group and record header, in file order.
+
+    For groups, flags, formid and vc_info hold the raw label, group type
+    and stamp. parent is the offset of the enclosing group (NO_PARENT at
+    the top level). The table is a single flat buffer, so it can be
+    written to disk as-is and mmapped back.
+    """
+    entry = struct.Struct('<4sIIIIIII')
+
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def build(cls, buffer, start, end, enclosing=()):
+        """
+        Scan the headers between start and end. enclosing lists the
+        (end, offset) of the groups around start, outermost first, when
+        start is not at the top level.
+        """
+        unpack_from = _full_header.unpack_from
+        pack = cls.entry.pack
+        data = bytearray()
+        stack = list(enclosing)  # (end, offset) of the groups we are inside of
+        offset = start
+        while offset < end:
+            while stack and offset >= stack[-1][0]:
+                stack.pop()
+            type, size, flags, formid, vc_info = unpack_from(buffer, offset)
+            parent = stack[-1][1] if stack else NO_PARENT
+            data += pack(
+                type, size, flags, formid, vc_info, offset, parent, len(stack))
+            if type == b'GRUP':
+                stack.append((offset + size, offset))
+                offset += 20
+            else:
+                offset += 20 + size
+        return cls(data)
+
+    def __len__(self):
+        return len(self.data) // self.entry.size
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return Entry._make(self.entry.unpack_from(self.data, i * self.entry.size))
+
+    def __iter__(self):
+        return map(Entry._make, self.entry.iter_unpack(self.data))
+
+
+class FormIdIndex:
+    """
+    Maps FormIDs to record offsets using a sorted FormID array and a
+    parallel offset array, so the whole index is two flat buffers.
+    """
+    def __init__(self, formids, offsets):
+        self.formids = formids
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, buffer, start, end):
+        formids = array('I')
+        offsets = array('I')
+        for formid, offset in iter_formids(buffer, start, end):
+            formids.append(formid)
+            offsets.append(offset)
+        order = sorted(range(len(formids)), key=formids.__getitem__)
+        return cls(
+            array('I', (formids[i] for i in order)),
+            array('I', (offsets[i] for i in order)),
+        )
+
+    @classmethod
+    def from_table(cls, table):
+        records = sorted(
+            (entry.formid, entry.offset) for entry in table
+            if entry.type != b'GRUP'
+        )
+        return cls(
+            array('I', (formid for formid, offset in records)),
+            array('I', (offset for formid, offset in records)),
+        )
+
+    def __len__(self):
+        return len(self.formids)
+
+    def __iter__(self):
+        return iter(self.formids)
+
+    def __contains__(self, formid):
+        return self._find(formid) is not None
+
+    def __getitem__(self, formid):
+        i = self._find(formid)
+        if i is None:
+            raise KeyError(formid)
+        return self.offsets[i]
+
+    def get(self, formid, default=None):
+        i = self._find(formid)
+        return default if i is None else self.offsets[i]
+
+    def _find(self, formid):
+        formids = self.formids
+        i = bisect_left(formids, formid)
+        if i < len(formids) and formids[i] == formid:
+            return i
+        return None
+
+
+def fingerprint(buffer, sample=1 << 16):
+    """
+    Cheap content fingerprint: the size plus the first and last 64 KiB,
+    which covers the TES4 header and the tail of the last group.
+    """
+    digest = blake2b(digest_size=16)
+    digest.update(len(buffer).to_bytes(8, 'little'))
+    digest.update(buffer[:sample])
+    digest.update(buffer[-sample:])
+    return digest.digest()
+
+
+class IndexCache:
+    """
+    Sidecar file holding the HeaderTable and FormIdIndex of a plugin.
+
+    Layout: a fixed header, the header table entries, the sorted FormID
+    array and the offset array, all little-endian and 4-byte aligned so
+    the arrays can be used straight out of the mmap.
+    """
+    suffix = '.t4idx'
+    magic = b'T4IX'
+    version = 1
+    # magic, version, source size, source mtime_ns, fingerprint,
+    # number of entries, number of formids
+    header = struct.Struct('<4sIQQ16sII')
+
+    def __init__(self, plugin_path, cache_dir=None):
+        plugin_path = Path(str(plugin_path))
+        directory = plugin_path.parent if cache_dir is None else Path(str(cache_dir))
+        self.plugin_path = plugin_path
+        self.path = directory / (plugin_path.name + self.suffix)
+
+    def key(self, buffer):
+        stat = self.plugin_path.stat()
+        return stat.st_size, stat.st_mtime_ns, fingerprint(buffer)
+
+    def _map(self, buffer, stack):
+        """
+        Map the sidecar if it is there and matches buffer, registering
+        everything that needs closing on the ExitStack. Returns the mapped
+        view and the header fields following the key, or None.
+        """
+        try:
+            f = self.path.open('rb')
+        except OSError:
+            return None
+        with f:
+            if os.fstat(f.fileno()).st_size < self.header.size:
+                return None
+            mm = mmap(f.fileno(), 0, access=ACCESS_READ)
+        stack.enter_context(mm)
+        view = stack.enter_context(memoryview(mm))
+        magic, version, size, mtime_ns, digest, *counts = self.header.unpack_from(view)
+        if (magic, version) != (self.magic, self.version):
+            return None
+        if (size, mtime_ns, digest) != self.key(buffer):
+            return None
+        return view, counts
+
+    def _write(self, buffer, counts, parts):
+        """Replace the sidecar with the header, holding counts, and parts"""
+        size, mtime_ns, digest = self.key(buffer)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with tmp_path.open('wb') as f:
+            f.write(self.header.pack(
+                self.magic, self.version, size, mtime_ns, digest, *counts))
+            for part in parts:
+                f.write(part)
+        os.replace(str(tmp_path), str(self.path))
+
+    def load(self, buffer, stack):
+        """
+        Map the sidecar if it matches buffer, registering everything that
+        needs closing on the ExitStack. Returns (HeaderTable, FormIdIndex)
+        or None if there is no usable sidecar.
+        """
+        mapped = self._map(buffer, stack)
+        if mapped is None:
+            return None
+        view, (num_entries, num_formids) = mapped
+        start = self.header.size
+        end = start + num_entries * HeaderTable.entry.size
+        table = HeaderTable(stack.enter_context(view[start:end]))
+        start, end = end, end + num_formids * 4
+        formids = stack.enter_context(view[start:end].cast('I'))
+        start, end = end, end + num_formids * 4
+        offsets = stack.enter_context(view[start:end].cast('I'))
+        return table, FormIdIndex(formids, offsets)
+
+    def save(self, buffer, table, formid_index):
+        self._write(buffer, (len(table), len(formid_index)), (
+            table.data,
+            array('I', formid_index.formids).tobytes(),
+            array('I', formid_index.offsets).tobytes(),
+        ))
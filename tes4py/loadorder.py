@@ -0,0 +1,132 @@
+"""
+Several plugins opened together, with FormIDs resolved through each
+plugin's master list to load order indices
+"""
+from array import array
+from bisect import bisect_left
+import collections.abc
+import contextlib
+from .espesmformat import EspEsmFormat, Record
+
+
+class LoadOrder(collections.abc.Mapping):
+    """
+    Mapping from load-order FormIDs to the winning override Record.
+
+    All plugins share one index: a sorted array of keys
+    (formid << 8 | plugin index) and a parallel array of record offsets,
+    so every override of a FormID is a contiguous run and the winner is
+    its last entry.
+    """
+    max_plugins = 255
+
+    def __init__(self, paths, index_cache=None):
+        paths = list(paths)
+        if len(paths) > self.max_plugins:
+            raise ValueError('at most %d plugins are supported' % self.max_plugins)
+        self.plugins = [EspEsmFormat(path, index_cache) for path in paths]
+        self._keys = None
+        self._offsets = None
+        self._mod_indices = None
+        self._count = 0
+
+    def __enter__(self):
+        self._exit_stack = stack = contextlib.ExitStack()
+        with stack:
+            for plugin in self.plugins:
+                stack.enter_context(plugin)
+            self._build_index()
+            self._exit_stack = stack.pop_all()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self._exit_stack.close()
+
+    @property
+    def names(self):
+        return [plugin.path.name for plugin in self.plugins]
+
+    def mod_indices(self, plugin_index):
+        """
+        Load order index for every mod index byte used by a plugin:
+        its masters in order, then the plugin itself.
+        """
+        if self._mod_indices is None:
+            by_name = {name.lower(): i for i, name in enumerate(self.names)}
+            self._mod_indices = [
+                self._master_indices(i, by_name) for i in range(len(self.plugins))]
+        return self._mod_indices[plugin_index]
+
+    def _master_indices(self, plugin_index, by_name):
+        indices = []
+        for master in self.plugins[plugin_index].masters:
+            try:
+                indices.append(by_name[master.lower()])
+            except KeyError:
+                raise KeyError('%s requires missing master %s' % (
+                    self.names[plugin_index], master)) from None
+        indices.append(plugin_index)
+        return indices
+
+    def resolve(self, plugin_index, formid):
+        """Translate a FormID as stored in a plugin to a load order FormID"""
+        indices = self.mod_indices(plugin_index)
+        mod_index = min(formid >> 24, len(indices) - 1)
+        return indices[mod_index] << 24 | formid & 0xFFFFFF
+
+    def _build_index(self):
+        keys = array('Q')
+        offsets = array('I')
+        for i, plugin in enumerate(self.plugins):
+            indices = self.mod_indices(i)
+            last = len(indices) - 1
+            index = plugin.formid_index
+            for formid, offset in zip(index.formids, index.offsets):
+                mod_index = indices[min(formid >> 24, last)]
+                keys.append((mod_index << 24 | formid & 0xFFFFFF) << 8 | i)
+                offsets.append(offset)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self._keys = array('Q', (keys[i] for i in order))
+        self._offsets = array('I', (offsets[i] for i in order))
+        self._count = sum(1 for formid in self)
+
+    def _range(self, formid):
+        keys = self._keys
+        start = bisect_left(keys, formid << 8)
+        end = bisect_left(keys, (formid + 1) << 8, start)
+        return start, end
+
+    def overrides(self, formid):
+        """(plugin, Record) for every plugin defining formid, in load order"""
+        start, end = self._range(formid)
+        result = []
+        for i in range(start, end):
+            plugin = self.plugins[self._keys[i] & 0xFF]
+            result.append((plugin, Record(plugin.view, self._offsets[i], plugin)))
+        return result
+
+    def winner(self, formid):
+        """(plugin, Record) of the last plugin to define formid"""
+        start, end = self._range(formid)
+        if start == end:
+            raise KeyError(formid)
+        plugin = self.plugins[self._keys[end - 1] & 0xFF]
+        return plugin, Record(plugin.view, self._offsets[end - 1], plugin)
+
+    def __getitem__(self, formid):
+        return self.winner(formid)[1]
+
+    def __contains__(self, formid):
+        start, end = self._range(formid)
+        return start != end
+
+    def __iter__(self):
+        last = None
+        for key in self._keys:
+            formid = key >> 8
+            if formid != last:
+                yield formid
+                last = formid
+
+    def __len__(self):
+        return self._count
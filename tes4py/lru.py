@@ -0,0 +1,59 @@
+"""
+Least-recently-used cache bounded by the total size of its values
+"""
+from collections import OrderedDict
+
+
+class ByteLRUCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        nbytes = len(value)
+        if key in self._items:
+            self.size -= len(self._items.pop(key))
+        if nbytes > self.max_bytes:
+            return value  # would evict everything and still not fit
+        self._items[key] = value
+        self.size += nbytes
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+        return value
+
+    def clear(self):
+        self._items.clear()
+        self.size = 0
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._items),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+        }
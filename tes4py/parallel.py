@@ -0,0 +1,89 @@
+"""
+Fan work over a plugin out to a process pool.
+
+The file is split into spans of whole groups and records; every worker
+mmaps the plugin read-only once and runs a function over the spans it is
+handed, returning compact results (bytes, arrays, tuples) instead of
+pickled Record objects.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from mmap import mmap, ACCESS_READ
+import os
+import struct
+from .index import HeaderTable
+
+_header = struct.Struct('<4sL')
+
+
+def partition(buffer, start, end, target, enclosing=()):
+    """
+    Yield (start, end, enclosing) spans covering start..end in file order.
+
+    Runs of small groups and records are merged until they reach target
+    bytes; groups larger than target are split into their header and
+    their children, so one huge WRLD group does not end up on one core.
+    """
+    chunk_start = offset = start
+    while offset < end:
+        type, size = _header.unpack_from(buffer, offset)
+        if type == b'GRUP':
+            total_size = size
+        else:
+            total_size = size + 20
+        if type == b'GRUP' and total_size > target:
+            if chunk_start < offset:
+                yield chunk_start, offset, enclosing
+            yield offset, offset + 20, enclosing
+            yield from partition(
+                buffer, offset + 20, offset + total_size, target,
+                enclosing + ((offset + total_size, offset),))
+            chunk_start = offset + total_size
+        elif offset + total_size - chunk_start >= target:
+            yield chunk_start, offset + total_size, enclosing
+            chunk_start = offset + total_size
+        offset += total_size
+    if chunk_start < end:
+        yield chunk_start, end, enclosing
+
+
+_worker_buffer = None
+
+
+def _open_worker(path):
+    global _worker_buffer
+    with open(path, 'rb') as f:
+        _worker_buffer = mmap(f.fileno(), 0, access=ACCESS_READ)
+
+
+def _run(func, start, end, enclosing):
+    return func(_worker_buffer, start, end, enclosing)
+
+
+def parallel_map(path, func, processes=None, chunks_per_process=4):
+    """
+    Run func(buffer, start, end, enclosing) over every span of the plugin
+    at path in a process pool and return the results in file order.
+
+    func must be a picklable module-level function.
+    """
+    path = str(path)
+    processes = processes or os.cpu_count() or 1
+    with open(path, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as mm:
+        header_size = _header.unpack_from(mm, 0)[1] + 20
+        target = max(
+            (len(mm) - header_size) // (processes * chunks_per_process), 1)
+        spans = list(partition(mm, header_size, len(mm), target))
+    with ProcessPoolExecutor(
+            processes, initializer=_open_worker, initargs=(path,)) as pool:
+        futures = [pool.submit(_run, func, *span) for span in spans]
+        return [future.result() for future in futures]
+
+
+def _scan_headers(buffer, start, end, enclosing):
+    return bytes(HeaderTable.build(buffer, start, end, enclosing).data)
+
+
+def header_table(path, processes=None):
+    """HeaderTable of the plugin at path, scanned in parallel"""
+    return HeaderTable(bytearray().join(
+        parallel_map(path, _scan_headers, processes)))
@@ -0,0 +1,193 @@
+"""
+Record queries with the cheap predicates pushed down to the header scan
+
+    esm.query(type='WEAP', flags='~deleted',
+              where=lambda record: record.decoded()['DATA'].value > 100)
+
+Type, flags, FormID and top group label are tested on the raw header
+fields before any Record is built, and groups that can not hold a
+matching record are jumped over whole. Only survivors reach where.
+"""
+from array import array
+import struct
+from .espesmformat import GroupType, Record
+from .index import fingerprint
+from .lru import ByteLRUCache
+
+_header = struct.Struct('<4sLLL')
+
+# record types that live below a top group labelled otherwise
+CONTAINERS = {
+    'CELL': ('CELL', 'WRLD'),
+    'REFR': ('CELL', 'WRLD'),
+    'ACHR': ('CELL', 'WRLD'),
+    'ACRE': ('CELL', 'WRLD'),
+    'PGRD': ('CELL', 'WRLD'),
+    'LAND': ('WRLD',),
+    'ROAD': ('WRLD',),
+    'INFO': ('DIAL',),
+}
+
+# record types found in the children groups of a cell
+CELL_CHILDREN = {'REFR', 'ACHR', 'ACRE', 'PGRD', 'LAND'}
+
+_cell_children_groups = {
+    GroupType.cell_children,
+    GroupType.cell_persistent,
+    GroupType.cell_temporary_children,
+    GroupType.cell_visible_distant_children,
+}
+
+# offsets of the results of memoized queries, as bytes of an array('I')
+query_cache = ByteLRUCache(16 << 20)
+
+
+def _label(label):
+    return int.from_bytes(label.encode('latin1'), 'little')
+
+
+def _names(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.replace(',', ' ').split()
+    return frozenset(value)
+
+
+def parse_flags(flags):
+    """
+    (required, forbidden) masks of Record.flags names, given as a string
+    like 'is_persistent,~deleted' or an iterable of such names
+    """
+    required = forbidden = 0
+    for name in _names(flags) or ():
+        if name.startswith('~'):
+            forbidden |= Record.flags.mask(name[1:])
+        else:
+            required |= Record.flags.mask(name)
+    return required, forbidden
+
+
+class Query:
+    """
+    type: a record type or several.
+    flags: required and forbidden flag names, see parse_flags.
+    formid: a FormID, a range of them or any container of them.
+    group: the label of the top group(s) to look in.
+    where: called with each surviving Record, which is kept if it returns
+    true.
+    """
+    def __init__(self, type=None, flags=None, formid=None, group=None, where=None):
+        self.types = _names(type)
+        self.required, self.forbidden = parse_flags(flags)
+        if isinstance(formid, int):
+            formid = (formid,)
+        elif formid is not None and not isinstance(formid, range):
+            formid = frozenset(formid)
+        self.formids = formid
+        self.where = where
+
+        groups = _names(group)
+        if self.types is not None:
+            containers = set()
+            for type in self.types:
+                containers.update(CONTAINERS.get(type, (type,)))
+            groups = frozenset(containers) if groups is None else groups & containers
+        self.groups = groups
+        self._labels = None if groups is None else {_label(label) for label in groups}
+
+        self._skipped_group_types = set()
+        if self.types is not None:
+            if not self.types & CELL_CHILDREN:
+                self._skipped_group_types |= _cell_children_groups
+            if 'INFO' not in self.types:
+                self._skipped_group_types.add(GroupType.topic_children)
+
+    def key(self):
+        """The header predicates, which is all memoize caches on; not where"""
+        return (self.types, self.required, self.forbidden, self.formids,
+                self.groups)
+
+    def scan(self, buffer, start, end, plugin=None):
+        """Yield every Record between start and end that matches"""
+        records = self.scan_headers(buffer, start, end, plugin)
+        if self.where is None:
+            return records
+        return filter(self.where, records)
+
+    def scan_headers(self, buffer, start, end, plugin=None):
+        """Yield the Records between start and end matching all but where"""
+        unpack_from = _header.unpack_from
+        types = None if self.types is None else {
+            type.encode('latin1') for type in self.types}
+        required, forbidden = self.required, self.forbidden
+        formids = self.formids
+        labels = self._labels
+        skipped = self._skipped_group_types
+        top_end = start
+        offset = start
+        while offset < end:
+            type, size, flags, formid = unpack_from(buffer, offset)
+            if type == b'GRUP':
+                # flags is the raw label and formid the group type
+                if offset >= top_end:
+                    top_end = offset + size
+                    if labels is not None and flags not in labels:
+                        offset += size
+                        continue
+                elif formid in skipped:
+                    offset += size
+                    continue
+                offset += 20
+                continue
+            if ((types is None or type in types) and
+                    flags & required == required and not flags & forbidden and
+                    (formids is None or formid in formids)):
+                yield Record(buffer, offset, plugin)
+            offset += 20 + size
+
+
+def _memo_key(esm, query):
+    stat = esm.path.stat()
+    return (str(esm.path), stat.st_size, stat.st_mtime_ns,
+            fingerprint(esm.view)) + query.key()
+
+
+def query(esm, type=None, flags=None, formid=None, group=None, where=None,
+          memoize=False):
+    """
+    Generator of the matching Records of an open plugin, in file order; see
+    Query for the predicates.
+
+    With memoize the offsets of the records passing the header predicates
+    are cached per file and query after a complete run, and later runs
+    read them back instead of scanning; where is still called on every
+    run. Only plugins opened from a path can be memoized, as the size,
+    mtime and fingerprint of the file tell when it changes.
+    """
+    q = Query(type, flags, formid, group, where)
+    if not memoize:
+        return q.scan(esm.view, esm.header_size, esm.total_size, esm)
+    if esm.path is None:
+        raise ValueError('memoize needs a plugin opened from a path')
+    records = _memoized(esm, q)
+    if where is None:
+        return records
+    return filter(where, records)
+
+
+def _memoized(esm, q):
+    view = esm.view
+    key = _memo_key(esm, q)
+    cached = query_cache.get(key)
+    if cached is not None:
+        offsets = array('I')
+        offsets.frombytes(cached)
+        for offset in offsets:
+            yield Record(view, offset, esm)
+        return
+    offsets = array('I')
+    for record in q.scan_headers(view, esm.header_size, esm.total_size, esm):
+        offsets.append(record.offset)
+        yield record
+    query_cache.put(key, offsets.tobytes())
@@ -0,0 +1,104 @@
+"""
+FormID reference graph of a plugin, both ways
+
+    esm.referenced_by(0x00012345)  # FormIDs of the records pointing at it
+    esm.references(0x00067890)     # FormIDs a record points at
+
+Built in one pass over the raw subrecords, reading FormIDs only at the
+offsets the schema marks as references (FormIdFields and the
+formid_fields of NamedTupleFields). Each direction is stored CSR style:
+sorted unique FormIDs, start offsets into a targets array, and the
+targets, so a lookup is one bisect and one slice.
+"""
+from array import array
+from bisect import bisect_left
+import struct
+from .espesmformat import record_body, scan_subrecords
+from .schema import schema as default_schema
+
+_header = struct.Struct('<4sLLL')
+_formid = struct.Struct('<L')
+
+
+class Adjacency:
+    """FormID -> sorted FormIDs, as CSR arrays"""
+    def __init__(self, formids, starts, targets):
+        self.formids = formids
+        self.starts = starts  # len(formids) + 1 offsets into targets
+        self.targets = targets
+
+    @classmethod
+    def from_edges(cls, edges):
+        """edges: sorted unique (formid << 32 | target) integers"""
+        formids, starts, targets = array('I'), array('I'), array('I')
+        last = None
+        for edge in edges:
+            formid = edge >> 32
+            if formid != last:
+                formids.append(formid)
+                starts.append(len(targets))
+                last = formid
+            targets.append(edge & 0xFFFFFFFF)
+        starts.append(len(targets))
+        return cls(formids, starts, targets)
+
+    def __len__(self):
+        return len(self.formids)
+
+    def __getitem__(self, formid):
+        formids = self.formids
+        i = bisect_left(formids, formid)
+        if i < len(formids) and formids[i] == formid:
+            return self.targets[self.starts[i]:self.starts[i + 1]].tolist()
+        return []
+
+
+def _record_layouts(schema):
+    """raw record type -> {raw subrecord type: FormID offsets}, filled lazily"""
+    class Layouts(dict):
+        def __missing__(self, type):
+            layouts = self[type] = {
+                stype.encode('latin1'): offsets
+                for stype, offsets in schema.formid_offsets(type.decode('latin1')).items()
+            }
+            return layouts
+    return Layouts()
+
+
+def _targets(buffer, offset, layouts, plugin=None):
+    """Yield the nonzero FormIDs referenced by the record at offset"""
+    unpack_formid = _formid.unpack_from
+    buf, start, end = record_body(buffer, offset, plugin)
+    for type, position, size in scan_subrecords(buf, start, end):
+        offsets = layouts.get(type)
+        if offsets is not None:
+            for field in offsets:
+                if field + 4 <= size:
+                    target = unpack_formid(buf, position + 6 + field)[0]
+                    if target:
+                        yield target
+
+
+class ReferenceGraph:
+    def __init__(self, references, referenced_by):
+        self.references = references  # Adjacency: source -> targets
+        self.referenced_by = referenced_by  # Adjacency: target -> sources
+
+    @classmethod
+    def build(cls, buffer, start, end, schema=None, plugin=None):
+        layouts = _record_layouts(schema or default_schema)
+        edges = set()
+        offset = start
+        while offset < end:
+            type, size, flags, formid = _header.unpack_from(buffer, offset)
+            if type == b'GRUP':
+                offset += 20
+                continue
+            subrecord_layouts = layouts[type]
+            if subrecord_layouts:
+                for target in _targets(buffer, offset, subrecord_layouts, plugin):
+                    edges.add(formid << 32 | target)
+            offset += 20 + size
+        forward = sorted(edges)
+        backward = sorted((edge & 0xFFFFFFFF) << 32 | edge >> 32 for edge in forward)
+        return cls(Adjacency.from_edges(forward), Adjacency.from_edges(backward))
@@ -0,0 +1,209 @@
+"""
+Layouts of subrecord bodies per record type, and decoders generated from them
+
+Subrecord layouts are binutils fields used without an offset: each one
+decodes a whole subrecord body through StructField.unpack_body.
+"""
+import struct
+from .binutils import *
+
+_type = struct.Struct('<4s')
+
+ANY = '*'
+
+
+class RecordDecoder:
+    """
+    Decodes every subrecord of one record type in a single pass.
+
+    Layouts are looked up by the raw 4 byte subrecord type, so nothing is
+    decoded or sliced for the lookup itself. Subrecords without a layout,
+    or too short for theirs, come out as bytes.
+    """
+    def __init__(self, layouts):
+        # raw type -> (type, unpack_body, repeated)
+        self.layouts = {
+            type.encode('latin1'): (type, field.unpack_body, repeated)
+            for type, (field, repeated) in layouts.items()
+        }
+
+    def decode(self, record):
+        """
+        Dict of subrecord type -> value. Types registered as repeated map
+        to a list of values; other types that happen to occur more than
+        once are collected into a list as well.
+        """
+        result = {}
+        layouts = self.layouts
+        unpack_type = _type.unpack_from
+        for buf, offset, size in record._scan_subrecords():
+            raw_type = unpack_type(buf, offset)[0]
+            start = offset + 6
+            try:
+                type, unpack_body, repeated = layouts[raw_type]
+            except KeyError:
+                type, repeated = raw_type.decode('latin1'), False
+                value = bytes(buf[start:start + size])
+            else:
+                try:
+                    value = unpack_body(buf, start, size)
+                except struct.error:
+                    value = bytes(buf[start:start + size])
+            if repeated:
+                result.setdefault(type, []).append(value)
+            elif type in result:
+                previous = result[type]
+                if isinstance(previous, list):
+                    previous.append(value)
+                else:
+                    result[type] = [previous, value]
+            else:
+                result[type] = value
+        return result
+
+
+class Schema:
+    """Registry of (record type, subrecord type) -> layout"""
+    def __init__(self):
+        self._layouts = {}
+        self._decoders = {}
+
+    def register(self, record_types, subrecord_types, field, repeated=False):
+        """
+        record_types may include ANY for layouts shared by every record
+        type, which specific registrations override.
+        """
+        for record_type in record_types:
+            for subrecord_type in subrecord_types:
+                self._layouts[record_type, subrecord_type] = (field, repeated)
+        self._decoders.clear()
+
+    def lookup(self, record_type, subrecord_type):
+        """(field, repeated) for a subrecord, or None"""
+        return (self._layouts.get((record_type, subrecord_type)) or
+                self._layouts.get((ANY, subrecord_type)))
+
+    def layouts(self, record_type):
+        layouts = {}
+        for (rtype, stype), layout in self._layouts.items():
+            if rtype == ANY:
+                layouts.setdefault(stype, layout)
+        for (rtype, stype), layout in self._layouts.items():
+            if rtype == record_type:
+                layouts[stype] = layout
+        return layouts
+
+    def decoder(self, record_type):
+        try:
+            return self._decoders[record_type]
+        except KeyError:
+            decoder = self._decoders[record_type] = RecordDecoder(
+                self.layouts(record_type))
+            return decoder
+
+    def decode(self, record):
+        return self.decoder(record.type).decode(record)
+
+    def formid_offsets(self, record_type):
+        """
+        Subrecord type -> byte offsets of the FormID references in its body,
+        for the subrecords of record_type that have any
+        """
+        result = {}
+        for type, (field, repeated) in self.layouts(record_type).items():
+            offsets = getattr(field, 'formid_offsets', ())
+            if offsets:
+                result[type] = offsets
+        return result
+
+
+zstring = ZStringField()
+formid = FormIdField()
+ubyte = ScalarField('<B')
+float32 = ScalarField('<f')
+
+schema = Schema()
+register = schema.register
+
+register([ANY], ['EDID', 'FULL', 'MODL', 'ICON', 'DESC'], zstring)
+register([ANY], ['SCRI'], formid)
+register([ANY], ['CTDA'], NamedTupleField(
+    '<B3xfLLL4x', 'Condition',
+    ['type', 'value', 'function', 'param1', 'param2']), repeated=True)
+register([ANY], ['SCRO'], formid, repeated=True)
+
+register(['TES4'], ['HEDR'], NamedTupleField(
+    '<fLL', 'Header', ['version', 'num_records', 'next_object_id']))
+register(['TES4'], ['CNAM', 'SNAM'], zstring)
+register(['TES4'], ['MAST'], zstring, repeated=True)
+register(['TES4'], ['DATA'], ScalarField('<Q'), repeated=True)
+
+register(['GLOB'], ['FNAM'], ubyte)
+register(['GLOB'], ['FLTV'], float32)
+
+register(['CLOT', 'MISC', 'KEYM', 'SLGM'], ['DATA'], NamedTupleField(
+    '<Lf', 'ItemData', ['gold_value', 'weight']))
+register(['CLOT', 'ARMO'], ['BMDT'], FlagsField(
+    hide_rings=0x00010000,
+    hide_amulet=0x00020000,
+    nonplayable=0x00400000,
+))
+register(['CLOT', 'ARMO', 'WEAP', 'AMMO', 'BOOK'], ['ENAM'], formid)
+register(['ARMO'], ['DATA'], NamedTupleField(
+    '<HLLf', 'ArmorData', ['armor', 'value', 'health', 'weight']))
+register(['WEAP'], ['DATA'], NamedTupleField(
+    '<LffLLLfH', 'WeaponData',
+    ['type', 'speed', 'reach', 'flags', 'value', 'health', 'weight', 'damage']))
+register(['AMMO'], ['DATA'], NamedTupleField(
+    '<fB3xLfH', 'AmmoData', ['speed', 'flags', 'value', 'weight', 'damage']))
+register(['BOOK'], ['DATA'], NamedTupleField(
+    '<BbLf', 'BookData', ['flags', 'teaches', 'value', 'weight']))
+register(['INGR', 'ALCH'], ['DATA'], float32)
+register(['INGR', 'ALCH'], ['ENIT'], NamedTupleField(
+    '<LB3x', 'Enchantment', ['value', 'flags']))
+
+register(['CONT', 'NPC_', 'CREA'], ['CNTO'], NamedTupleField(
+    '<Ll', 'ContainerItem', ['item', 'count'], ['item']), repeated=True)
+register(['CONT'], ['DATA'], NamedTupleField('<Bf', 'ContainerData', ['flags', 'weight']))
+
+register(['NPC_', 'CREA'], ['ACBS'], NamedTupleField(
+    '<LHHHhHH', 'BaseStats',
+    ['flags', 'base_spell', 'fatigue', 'barter_gold', 'level', 'calc_min', 'calc_max']))
+register(['NPC_', 'CREA'], ['SPLO', 'PKID'], formid, repeated=True)
+register(['NPC_', 'CREA'], ['SNAM'], NamedTupleField(
+    '<LB3x', 'FactionRank', ['faction', 'rank'], ['faction']), repeated=True)
+register(['NPC_', 'CREA'], ['INAM'], formid)
+register(['NPC_'], ['RNAM', 'CNAM', 'HNAM', 'ENAM'], formid)
+
+register(['SPEL'], ['SPIT'], NamedTupleField(
+    '<LLLB3x', 'SpellData', ['type', 'cost', 'level', 'flags']))
+
+register(['LVLI', 'LVLC', 'LVSP'], ['LVLD', 'LVLF'], ubyte)
+register(['LVLI', 'LVLC', 'LVSP'], ['LVLO'], NamedTupleField(
+    '<h2xLh', 'LeveledEntry', ['level', 'item', 'count'], ['item']), repeated=True)
+
+register(['QUST'], ['DATA'], NamedTupleField('<BB', 'QuestData', ['flags', 'priority']))
+
+register(['DIAL'], ['QSTI', 'QSTR'], formid, repeated=True)
+register(['DIAL'], ['DATA'], ubyte)
+register(['INFO'], ['DATA'], NamedTupleField(
+    '<BBB', 'InfoData', ['type', 'next_speaker', 'flags']))
+register(['INFO'], ['QSTI', 'TPIC', 'PNAM'], formid)
+register(['INFO'], ['NAME', 'TCLT', 'TCLF'], formid, repeated=True)
+register(['INFO'], ['TRDT'], NamedTupleField(
+    '<ll4xB3x', 'ResponseData', ['emotion_type', 'emotion_value', 'response_number']),
+    repeated=True)
+register(['INFO'], ['NAM1', 'NAM2'], zstring, repeated=True)
+
+register(['SCPT'], ['SCTX'], zstring)
+
+register(['CELL'], ['DATA'], ubyte)
+register(['CELL'], ['XCLC'], NamedTupleField('<ll', 'CellGrid', ['x', 'y']))
+register(['CELL', 'REFR', 'ACHR', 'ACRE'], ['XOWN'], formid)
+register(['REFR', 'ACHR', 'ACRE'], ['NAME'], formid)
+register(['REFR', 'ACHR', 'ACRE'], ['DATA'], NamedTupleField(
+    '<6f', 'Position', ['x', 'y', 'z', 'rx', 'ry', 'rz']))
+register(['REFR', 'ACHR', 'ACRE'], ['XESP'], NamedTupleField(
+    '<LB3x', 'EnableParent', ['parent', 'flags'], ['parent']))
+
+register(['WRLD'], ['WNAM', 'CNAM', 'NAM2'], formid)
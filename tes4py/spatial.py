@@ -0,0 +1,172 @@
+"""
+Spatial index of the exterior cells and placed references of each worldspace
+
+    world = esm.spatial_index[0x0000003C]
+    world.box(-4096, -4096, 4096, 4096)
+    world.radius(1000.0, 2000.0, 500.0)
+
+References are bucketed by the exterior cell their DATA position falls
+in (a 4096 unit grid), and every bucket is a contiguous run of flat
+position arrays, so a query only looks at the cells it overlaps.
+Worldspaces are told apart by the world_children groups of the WRLD
+top group; cells also keep their XCLC grid coordinates.
+"""
+from array import array
+from collections import namedtuple
+import collections.abc
+import math
+import struct
+from .espesmformat import GroupType, record_body, scan_subrecords
+
+_header = struct.Struct('<4sLLL')
+_position = struct.Struct('<3f')
+_grid = struct.Struct('<ll')
+
+CELL_SIZE = 4096
+
+REFERENCE_TYPES = {b'REFR', b'ACHR', b'ACRE'}
+
+Placed = namedtuple('Placed', ['formid', 'offset', 'x', 'y', 'z'])
+
+
+def _subrecord(buffer, offset, type, plugin=None):
+    """(buffer, body offset, size) of the first subrecord of a type, or None"""
+    buf, start, end = record_body(buffer, offset, plugin)
+    for stype, position, size in scan_subrecords(buf, start, end):
+        if stype == type:
+            return buf, position + 6, size
+    return None
+
+
+def cell_of(x, y):
+    return int(math.floor(x / CELL_SIZE)), int(math.floor(y / CELL_SIZE))
+
+
+class WorldIndex:
+    def __init__(self, formid):
+        self.formid = formid
+        self.cells = {}  # (x, y) -> offset of the CELL record
+        self.formids = array('I')
+        self.offsets = array('I')
+        self.xs = array('f')
+        self.ys = array('f')
+        self.zs = array('f')
+        self._buckets = {}  # (x, y) -> (start, end) into the arrays
+
+    def _add(self, formid, offset, x, y, z):
+        self.formids.append(formid)
+        self.offsets.append(offset)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.zs.append(z)
+
+    def _finish(self):
+        """Sort the references by cell, making each cell a contiguous run"""
+        xs, ys = self.xs, self.ys
+        keys = [cell_of(xs[i], ys[i]) for i in range(len(xs))]
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        for name in ('formids', 'offsets', 'xs', 'ys', 'zs'):
+            values = getattr(self, name)
+            setattr(self, name, array(values.typecode, (values[i] for i in order)))
+        buckets = self._buckets
+        for position, i in enumerate(order):
+            start, end = buckets.get(keys[i], (position, position))
+            buckets[keys[i]] = start, position + 1
+
+    def __len__(self):
+        return len(self.formids)
+
+    def _placed(self, i):
+        return Placed(self.formids[i], self.offsets[i], self.xs[i], self.ys[i], self.zs[i])
+
+    def _candidates(self, x0, y0, x1, y1):
+        """Ranges of the buckets overlapping a box"""
+        cx0, cy0 = cell_of(x0, y0)
+        cx1, cy1 = cell_of(x1, y1)
+        buckets = self._buckets
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(buckets):
+            for (cx, cy), bucket in buckets.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    yield bucket
+            return
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = buckets.get((cx, cy))
+                if bucket is not None:
+                    yield bucket
+
+    def box(self, x0, y0, x1, y1):
+        """Placed references with x0 <= x <= x1 and y0 <= y <= y1"""
+        xs, ys = self.xs, self.ys
+        result = []
+        for start, end in self._candidates(x0, y0, x1, y1):
+            for i in range(start, end):
+                if x0 <= xs[i] <= x1 and y0 <= ys[i] <= y1:
+                    result.append(self._placed(i))
+        return result
+
+    def radius(self, x, y, r):
+        """Placed references within r of (x, y), ignoring z"""
+        xs, ys = self.xs, self.ys
+        r2 = r * r
+        result = []
+        for start, end in self._candidates(x - r, y - r, x + r, y + r):
+            for i in range(start, end):
+                dx, dy = xs[i] - x, ys[i] - y
+                if dx * dx + dy * dy <= r2:
+                    result.append(self._placed(i))
+        return result
+
+    def in_cell(self, x, y):
+        """Placed references whose position falls in the cell at grid (x, y)"""
+        start, end = self._buckets.get((x, y), (0, 0))
+        return [self._placed(i) for i in range(start, end)]
+
+
+class SpatialIndex(collections.abc.Mapping):
+    """Worldspace FormID -> WorldIndex"""
+    def __init__(self, worlds):
+        self.worlds = worlds
+
+    @classmethod
+    def build(cls, buffer, start, end, plugin=None):
+        """Index the exterior cells and references between start and end"""
+        worlds = {}
+        world = None
+        world_end = start
+        offset = start
+        while offset < end:
+            if offset >= world_end:
+                world = None
+            type, size, flags, formid = _header.unpack_from(buffer, offset)
+            if type == b'GRUP':
+                # flags is the raw label and formid the group type
+                if formid == GroupType.world_children:
+                    world = worlds.get(flags)
+                    if world is None:
+                        world = worlds[flags] = WorldIndex(flags)
+                    world_end = offset + size
+                offset += 20
+                continue
+            if world is not None:
+                if type == b'CELL':
+                    found = _subrecord(buffer, offset, b'XCLC', plugin)
+                    if found is not None and found[2] >= _grid.size:
+                        world.cells[_grid.unpack_from(found[0], found[1])] = offset
+                elif type in REFERENCE_TYPES:
+                    found = _subrecord(buffer, offset, b'DATA', plugin)
+                    if found is not None and found[2] >= _position.size:
+                        world._add(formid, offset, *_position.unpack_from(found[0], found[1]))
+            offset += 20 + size
+        for world in worlds.values():
+            world._finish()
+        return cls(worlds)
+
+    def __getitem__(self, formid):
+        return self.worlds[formid]
+
+    def __iter__(self):
+        return iter(self.worlds)
+
+    def __len__(self):
+        return len(self.worlds)
@@ -0,0 +1,195 @@
+"""
+Materialize plugins into SQLite for ad-hoc indexed queries
+
+    materialize('plugins.db', ['Oblivion.esm', 'Patch.esp'])
+
+    SELECT r.formid FROM subrecords s JOIN records r
+        ON r.plugin_id = s.plugin_id AND r.offset = s.record_offset
+        WHERE s.type = 'SCRI' AND s.value = ?
+
+Plugins are keyed by path and reloaded only when their size, mtime or
+fingerprint changed.
+"""
+from itertools import islice
+import json
+import sqlite3
+import struct
+from pathlib import Path
+from .espesmformat import EspEsmFormat, record_body, scan_subrecords
+from .export import jsonable
+from .index import fingerprint, NO_PARENT
+from .schema import schema as default_schema
+
+BATCH_SIZE = 10000
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS plugins (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    fingerprint BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS groups (
+    plugin_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    label TEXT,
+    group_type INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    parent INTEGER,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (plugin_id, offset)
+);
+CREATE TABLE IF NOT EXISTS records (
+    plugin_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    formid INTEGER NOT NULL,
+    flags INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    parent INTEGER,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (plugin_id, offset)
+);
+CREATE TABLE IF NOT EXISTS subrecords (
+    plugin_id INTEGER NOT NULL,
+    record_offset INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    value,
+    PRIMARY KEY (plugin_id, record_offset, position)
+);
+CREATE INDEX IF NOT EXISTS records_formid ON records (formid);
+CREATE INDEX IF NOT EXISTS records_type ON records (type);
+CREATE INDEX IF NOT EXISTS subrecords_value ON subrecords (type, value);
+'''
+
+
+def connect(db_path):
+    conn = sqlite3.connect(str(db_path))
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _batched(rows):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def _insert(conn, sql, rows):
+    for batch in _batched(rows):
+        conn.executemany(sql, batch)
+
+
+def _parent(parent):
+    return None if parent == NO_PARENT else parent
+
+
+def _group_rows(plugin_id, table):
+    for entry in table:
+        if entry.type == b'GRUP':
+            label = entry.flags.to_bytes(4, 'little')
+            yield (
+                plugin_id, entry.offset,
+                label.decode('latin1') if entry.formid == 0 else None,
+                entry.formid, entry.size, _parent(entry.parent), entry.depth)
+
+
+def _record_rows(plugin_id, table):
+    for entry in table:
+        if entry.type != b'GRUP':
+            yield (
+                plugin_id, entry.offset, entry.type.decode('latin1'),
+                entry.formid, entry.flags, entry.size,
+                _parent(entry.parent), entry.depth)
+
+
+def _value(value):
+    """Scalars as they are, decoded structures as JSON text"""
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return json.dumps(jsonable(value))
+
+
+def _subrecord_rows(plugin_id, esm, table, schema):
+    view = esm.view
+    for entry in table:
+        if entry.type == b'GRUP':
+            continue
+        record_type = entry.type.decode('latin1')
+        buf, start, end = record_body(view, entry.offset, esm)
+        for position, (type, offset, size) in enumerate(scan_subrecords(buf, start, end)):
+            type = type.decode('latin1')
+            value = None
+            layout = schema.lookup(record_type, type)
+            if layout is not None:
+                try:
+                    value = _value(layout[0].unpack_body(buf, offset + 6, size))
+                except struct.error:
+                    pass
+            yield plugin_id, entry.offset, position, type, offset, size, value
+
+
+def _key(path, view):
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns, fingerprint(view)
+
+
+def load_plugin(conn, plugin_path, schema=None, index_cache=None):
+    """
+    Load one plugin in a single transaction unless it is already loaded
+    and unchanged. Returns True if it was (re)loaded.
+    """
+    schema = schema or default_schema
+    path = Path(str(plugin_path)).resolve()
+    with EspEsmFormat(path, index_cache) as esm:
+        key = _key(path, esm.view)
+        row = conn.execute(
+            'SELECT id, size, mtime_ns, fingerprint FROM plugins WHERE path = ?',
+            (str(path),)).fetchone()
+        if row is not None and tuple(row[1:]) == key:
+            return False
+        table = esm.header_table
+        with conn:
+            if row is not None:
+                plugin_id = row[0]
+                for name in ('groups', 'records', 'subrecords'):
+                    conn.execute('DELETE FROM %s WHERE plugin_id = ?' % name, (plugin_id,))
+                conn.execute(
+                    'UPDATE plugins SET size = ?, mtime_ns = ?, fingerprint = ? '
+                    'WHERE id = ?', key + (plugin_id,))
+            else:
+                plugin_id = conn.execute(
+                    'INSERT INTO plugins (path, size, mtime_ns, fingerprint) '
+                    'VALUES (?, ?, ?, ?)', (str(path),) + key).lastrowid
+            _insert(conn, 'INSERT INTO groups VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    _group_rows(plugin_id, table))
+            _insert(conn, 'INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    _record_rows(plugin_id, table))
+            _insert(conn, 'INSERT INTO subrecords VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    _subrecord_rows(plugin_id, esm, table, schema))
+    return True
+
+
+def materialize(db_path, plugin_paths, schema=None, index_cache=None):
+    """
+    Bring the database at db_path up to date with plugin_paths, returning
+    the paths that had to be (re)loaded.
+    """
+    conn = connect(db_path)
+    try:
+        return [
+            path for path in plugin_paths
+            if load_plugin(conn, path, schema, index_cache)
+        ]
+    finally:
+        conn.close()
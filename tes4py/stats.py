@@ -0,0 +1,74 @@
+"""
+Opt-in instrumentation of parsing
+
+    stats = Stats()
+    stats.add_callback(lambda phase, done, total: print(phase, done, total))
+    with EspEsmFormat(path, stats=stats) as esm:
+        ...
+    stats.as_dict()
+
+While a plugin opened with stats is open, its node objects created,
+bytes scanned, subrecord lookups, decompressions and decompression cache
+hits are counted and the main phases are timed. Other plugins, open at
+the same time or not, are not counted. Every node looks up its plugin's
+active Stats once, when it is created, and checks it once per scan
+rather than once per item, so it costs nothing when off.
+"""
+from collections import Counter, defaultdict
+import contextlib
+import time
+
+
+class Stats:
+    def __init__(self):
+        self.objects = Counter()  # node class name -> instances created
+        self.counters = Counter()
+        self.timings = defaultdict(float)  # phase -> seconds
+        self._callbacks = []
+        self._cache = None
+        self._cache_start = None
+        self._cache_totals = {'hits': 0, 'misses': 0}
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def add_callback(self, callback):
+        """callback(phase, done, total) is called as phases make progress"""
+        self._callbacks.append(callback)
+
+    def progress(self, phase, done, total):
+        for callback in self._callbacks:
+            callback(phase, done, total)
+
+    def start(self, cache):
+        """Begin counting the hits and misses of cache"""
+        self._cache = cache
+        self._cache_start = cache.hits, cache.misses
+
+    def stop(self):
+        self._cache_totals = self.cache_stats()
+        self._cache = None
+
+    def cache_stats(self):
+        totals = dict(self._cache_totals)
+        if self._cache is not None:
+            hits, misses = self._cache_start
+            totals['hits'] += self._cache.hits - hits
+            totals['misses'] += self._cache.misses - misses
+        return totals
+
+    def as_dict(self):
+        return {
+            'objects': dict(self.objects),
+            'counters': dict(self.counters),
+            'timings': dict(self.timings),
+            'decompression_cache': self.cache_stats(),
+        }
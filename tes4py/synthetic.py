@@ -0,0 +1,343 @@
+"""
+Generator of valid synthetic plugins, for tests and benchmarks
+
+    generate('Synthetic.esp', 10 << 20, seed=1)
+
+writes a plugin of about the requested size with top groups of several
+record types, compressed records, repeated subrecords and the nested
+CELL, WRLD and DIAL hierarchies. Output is streamed: group sizes are
+patched once the group is complete, so the plugin is never held in
+memory. The same arguments always produce the same bytes.
+"""
+import contextlib
+import math
+import random
+import struct
+import zlib
+from pathlib import Path
+from .espesmformat import COMPRESSED
+
+_record_header = struct.Struct('<4sLLLL')
+_group_header = struct.Struct('<4sL4sLL')
+_subrecord_header = struct.Struct('<4sH')
+
+# bumped whenever the output for given arguments changes, so cached
+# benchmark plugins are regenerated
+VERSION = 2
+
+# relative weight of each top group record type
+DEFAULT_MIX = {
+    'GMST': 1,
+    'CLOT': 3,
+    'ARMO': 2,
+    'WEAP': 2,
+    'CONT': 1,
+    'NPC_': 2,
+    'LVLI': 1,
+    'SPEL': 1,
+}
+
+# share of the size given to the regular top groups, CELL, WRLD and DIAL
+DEFAULT_SPLIT = (0.4, 0.15, 0.3, 0.15)
+
+CELLS_PER_SUBBLOCK = 8
+SUBBLOCKS_PER_BLOCK = 4
+
+INTERIOR_CELLS_PER_SUBBLOCK = 4
+INTERIOR_REFERENCES = 8
+
+# uncompressed bytes of a reference, and of an interior cell with its
+# children groups and references
+_REFERENCE_SIZE = _record_header.size + 2 * _subrecord_header.size + 4 + 24
+_INTERIOR_CELL_SIZE = (
+    _record_header.size + 2 * _subrecord_header.size + len('Interior000000\0\1')
+    + 3 * _group_header.size + (1 + INTERIOR_REFERENCES) * _REFERENCE_SIZE)
+
+
+def _subrecord(type, data):
+    return _subrecord_header.pack(type, len(data)) + data
+
+
+def _zstring(text):
+    return text.encode('latin1') + b'\0'
+
+
+class _PluginWriter:
+    def __init__(self, f, rng, compressed):
+        self.f = f
+        self.rng = rng
+        self.compressed = compressed
+        self.next_formid = 0x800
+        self.records = 0
+        self.formids = []
+
+    def tell(self):
+        return self.f.tell()
+
+    def formid(self):
+        formid = self.next_formid
+        self.next_formid += 1
+        return formid
+
+    def record(self, type, subrecords, formid=None, flags=0, compress=None):
+        if formid is None:
+            formid = self.formid()
+        if compress is None:
+            compress = self.rng.random() < self.compressed
+        body = b''.join(_subrecord(t, data) for t, data in subrecords)
+        if compress:
+            flags |= COMPRESSED
+            body = struct.pack('<L', len(body)) + zlib.compress(body)
+        self.f.write(_record_header.pack(type, len(body), flags, formid, 0))
+        self.f.write(body)
+        self.records += 1
+        if formid:
+            self.formids.append(formid)
+        return formid
+
+    @contextlib.contextmanager
+    def group(self, label, group_type=0):
+        if isinstance(label, int):
+            label = struct.pack('<L', label)
+        start = self.f.tell()
+        self.f.write(_group_header.pack(b'GRUP', 0, label, group_type, 0))
+        yield
+        end = self.f.tell()
+        self.f.seek(start + 4)
+        self.f.write(struct.pack('<L', end - start))
+        self.f.seek(end)
+
+
+class _Contents:
+    """Subrecords of each synthetic record type"""
+    def __init__(self, rng, writer):
+        self.rng = rng
+        self.writer = writer
+
+    def name(self, prefix):
+        return _zstring('%s%06X' % (prefix, self.writer.next_formid))
+
+    def items(self, count):
+        """Repeated formid references to records written so far"""
+        formids = self.writer.formids
+        if not formids:
+            return []
+        return [self.rng.choice(formids) for _ in range(count)]
+
+    def GMST(self):
+        return [(b'EDID', self.name('fSetting')),
+                (b'DATA', struct.pack('<f', self.rng.random()))]
+
+    def CLOT(self):
+        rng = self.rng
+        return [(b'EDID', self.name('Clothing')),
+                (b'FULL', self.name('Shirt ')),
+                (b'BMDT', struct.pack('<L', 0)),
+                (b'MODL', _zstring('Clothes\\Shirt.nif')),
+                (b'DATA', struct.pack('<Lf', rng.randrange(1000), rng.random() * 10))]
+
+    def ARMO(self):
+        rng = self.rng
+        return [(b'EDID', self.name('Armor')),
+                (b'FULL', self.name('Cuirass ')),
+                (b'BMDT', struct.pack('<L', 0)),
+                (b'DATA', struct.pack('<HLLf', rng.randrange(3000), rng.randrange(5000),
+                                      rng.randrange(2000), rng.random() * 50))]
+
+    def WEAP(self):
+        rng = self.rng
+        return [(b'EDID', self.name('Weapon')),
+                (b'FULL', self.name('Sword ')),
+                (b'DATA', struct.pack(
+                    '<LffLLLfH', rng.randrange(6), rng.random() + 0.5, 1.0, 0,
+                    rng.randrange(5000), rng.randrange(2000), rng.random() * 40,
+                    rng.randrange(30)))]
+
+    def CONT(self):
+        return [(b'EDID', self.name('Chest')),
+                (b'FULL', _zstring('Chest'))] + [
+            (b'CNTO', struct.pack('<Ll', item, self.rng.randrange(1, 5)))
+            for item in self.items(self.rng.randrange(1, 8))
+        ] + [(b'DATA', struct.pack('<Bf', 0, 50.0))]
+
+    def NPC_(self):
+        rng = self.rng
+        return [(b'EDID', self.name('Npc')),
+                (b'FULL', self.name('Citizen ')),
+                (b'ACBS', struct.pack('<LHHHhHH', 0, 0, 50, 0, rng.randrange(1, 50), 1, 50))] + [
+            (b'SNAM', struct.pack('<LB3x', faction, 0))
+            for faction in self.items(rng.randrange(0, 3))
+        ] + [
+            (b'CNTO', struct.pack('<Ll', item, 1))
+            for item in self.items(rng.randrange(0, 6))
+        ] + [
+            (b'SPLO', struct.pack('<L', spell))
+            for spell in self.items(rng.randrange(0, 4))
+        ]
+
+    def LVLI(self):
+        return [(b'EDID', self.name('LeveledItem')),
+                (b'LVLD', b'\0')] + [
+            (b'LVLO', struct.pack('<h2xLh2x', self.rng.randrange(1, 30), item, 1))
+            for item in self.items(self.rng.randrange(1, 10))
+        ]
+
+    def SPEL(self):
+        return [(b'EDID', self.name('Spell')),
+                (b'FULL', self.name('Fireball ')),
+                (b'SPIT', struct.pack('<LLLB3x', 0, self.rng.randrange(200), 0, 0))]
+
+    def reference(self, cell_x, cell_y):
+        rng = self.rng
+        base = self.items(1)
+        return [(b'NAME', struct.pack('<L', base[0] if base else 0)),
+                (b'DATA', struct.pack(
+                    '<6f', (cell_x + rng.random()) * 4096, (cell_y + rng.random()) * 4096,
+                    rng.random() * 1000, 0, 0, rng.random() * 6.28))]
+
+
+def _top_groups(writer, contents, mix, end):
+    types = sorted(mix)
+    total = sum(mix.values())
+    start = writer.tell()
+    budget = end - start
+    for type in types:
+        group_end = writer.tell() + budget * mix[type] // total
+        with writer.group(type.encode('latin1')):
+            make = getattr(contents, type)
+            while writer.tell() < group_end:
+                writer.record(type.encode('latin1'), make())
+
+
+def _cell_children(writer, contents, cell, x, y, references):
+    with writer.group(cell, 6):
+        with writer.group(cell, 8):
+            writer.record(b'REFR', contents.reference(x, y), compress=False)
+        with writer.group(cell, 9):
+            for i in range(references):
+                type = b'ACHR' if i % 7 == 0 else b'REFR'
+                writer.record(type, contents.reference(x, y), compress=False)
+
+
+def _interior_subblocks(budget):
+    """
+    Sub-blocks per block for the interior cells a budget fits, so that
+    there are about as many blocks as sub-blocks per block
+    """
+    cells = max(1, budget // _INTERIOR_CELL_SIZE)
+    subblocks = -(-cells // INTERIOR_CELLS_PER_SUBBLOCK)
+    return -(-subblocks // max(1, math.isqrt(subblocks)))
+
+
+def _interior_cells(writer, contents, end):
+    subblocks = _interior_subblocks(end - writer.tell())
+    with writer.group(b'CELL'):
+        block = 0
+        while writer.tell() < end:
+            with writer.group(struct.pack('<l', block), 2):
+                for subblock in range(subblocks):
+                    with writer.group(struct.pack('<l', subblock), 3):
+                        for _ in range(INTERIOR_CELLS_PER_SUBBLOCK):
+                            cell = writer.record(b'CELL', [
+                                (b'EDID', contents.name('Interior')),
+                                (b'DATA', b'\x01'),
+                            ])
+                            _cell_children(
+                                writer, contents, cell, 0, 0, INTERIOR_REFERENCES)
+                    if writer.tell() >= end:
+                        break
+            block += 1
+
+
+def _exterior_cells(writer, contents, end):
+    with writer.group(b'WRLD'):
+        world = writer.record(b'WRLD', [(b'EDID', _zstring('Tamriel'))])
+        with writer.group(world, 1):
+            cells = CELLS_PER_SUBBLOCK * SUBBLOCKS_PER_BLOCK
+            block_x = 0
+            while writer.tell() < end:
+                _exterior_block(writer, contents, block_x, 0, cells, end)
+                block_x += 1
+
+
+def _exterior_block(writer, contents, block_x, block_y, cells, end):
+    with writer.group(struct.pack('<hh', block_y, block_x), 4):
+        for sub_y in range(SUBBLOCKS_PER_BLOCK):
+            for sub_x in range(SUBBLOCKS_PER_BLOCK):
+                label = struct.pack(
+                    '<hh', block_y * SUBBLOCKS_PER_BLOCK + sub_y,
+                    block_x * SUBBLOCKS_PER_BLOCK + sub_x)
+                with writer.group(label, 5):
+                    for i in range(CELLS_PER_SUBBLOCK * CELLS_PER_SUBBLOCK):
+                        x = block_x * cells + sub_x * CELLS_PER_SUBBLOCK + i % CELLS_PER_SUBBLOCK
+                        y = block_y * cells + sub_y * CELLS_PER_SUBBLOCK + i // CELLS_PER_SUBBLOCK
+                        cell = writer.record(b'CELL', [
+                            (b'DATA', b'\x02'),
+                            (b'XCLC', struct.pack('<ll', x, y)),
+                        ])
+                        _cell_children(writer, contents, cell, x, y, 12)
+                        if writer.tell() >= end:
+                            return
+
+
+def _dialogue(writer, contents, end):
+    rng = writer.rng
+    with writer.group(b'QUST'):
+        quests = [
+            writer.record(b'QUST', [(b'EDID', contents.name('Quest')),
+                                    (b'DATA', b'\0\0')])
+            for _ in range(16)
+        ]
+    with writer.group(b'DIAL'):
+        while writer.tell() < end:
+            quest = rng.choice(quests)
+            topic = writer.record(b'DIAL', [
+                (b'EDID', contents.name('Topic')),
+                (b'QSTI', struct.pack('<L', quest)),
+                (b'FULL', contents.name('Topic ')),
+                (b'DATA', b'\0'),
+            ])
+            with writer.group(topic, 7):
+                for _ in range(rng.randrange(1, 8)):
+                    writer.record(b'INFO', [
+                        (b'DATA', b'\0\0\0'),
+                        (b'QSTI', struct.pack('<L', quest)),
+                        (b'CTDA', struct.pack('<B3xfLLL4x', 0, 1.0, 72, 0, 0)),
+                    ] + [
+                        (b'NAM1', _zstring('Response %d about the Amulet of Kings.' % i))
+                        for i in range(rng.randrange(1, 4))
+                    ])
+
+
+def generate(path, size, seed=0, compressed=0.1, mix=None, split=DEFAULT_SPLIT):
+    """
+    Write a synthetic plugin of roughly size bytes to path and return the
+    number of records written (TES4 header included).
+
+    compressed is the share of eligible records written compressed, mix
+    the relative weight of each top group record type and split the share
+    of the size taken by the top groups, CELL, WRLD and DIAL.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    with Path(str(path)).open('wb') as f:
+        writer = _PluginWriter(f, rng, compressed)
+        contents = _Contents(rng, writer)
+        writer.record(b'TES4', [
+            (b'HEDR', struct.pack('<fLL', 0.8, 0, 0)),
+            (b'CNAM', _zstring('tes4py')),
+        ], formid=0, flags=0x01, compress=False)
+        header_end = writer.tell()
+        budget = max(size - header_end, 0)
+        end = header_end
+        for share, build in zip(split, (
+                lambda end: _top_groups(writer, contents, mix, end),
+                lambda end: _interior_cells(writer, contents, end),
+                lambda end: _exterior_cells(writer, contents, end),
+                lambda end: _dialogue(writer, contents, end))):
+            end += int(budget * share)
+            build(end)
+        # patch HEDR's record count, which excludes the TES4 record itself
+        f.seek(_record_header.size + _subrecord_header.size + 4)
+        f.write(struct.pack('<L', writer.records - 1))
+    return writer.records
@@ -0,0 +1,58 @@
+"""
+NumPy view of the HeaderTable, for vectorized filtering of headers
+"""
+import numpy as np
+from .index import HeaderTable, NO_PARENT
+
+# mirrors HeaderTable.entry, so the table buffer is used as it is
+HEADER_DTYPE = np.dtype([
+    ('type', 'S4'),
+    ('size', '<u4'),
+    ('flags', '<u4'),
+    ('formid', '<u4'),
+    ('vc_info', '<u4'),
+    ('offset', '<u4'),
+    ('parent', '<u4'),
+    ('depth', '<u4'),
+])
+assert HEADER_DTYPE.itemsize == HeaderTable.entry.size
+
+
+def header_array(table):
+    """
+    Structured array over every group and record header of a HeaderTable.
+
+    For groups the flags, formid and vc_info columns hold the raw label,
+    group type and stamp, see HeaderTable. A table mapped from the index
+    cache is copied, as its mapping is closed with the plugin.
+    """
+    array = np.frombuffer(table.data, dtype=HEADER_DTYPE)
+    if isinstance(table.data, memoryview):
+        array = array.copy()
+    return array
+
+
+def records(array, type=None):
+    """The record rows of a header array, optionally of a single type"""
+    if type is None:
+        return array[array['type'] != b'GRUP']
+    return array[array['type'] == type.encode('latin1')]
+
+
+def groups(array, label=None):
+    """The group rows of a header array, optionally with a given label"""
+    mask = array['type'] == b'GRUP'
+    if label is not None:
+        mask &= array['flags'] == int.from_bytes(label.encode('latin1'), 'little')
+    return array[mask]
+
+
+def has_flags(array, *names):
+    """Mask of the rows with every one of the named Record.flags set"""
+    from .espesmformat import Record
+    mask = Record.flags.mask(*names)
+    return (array['flags'] & mask) == mask
+
+
+def top_level(array):
+    return array[array['parent'] == NO_PARENT]
@@ -0,0 +1,222 @@
+"""
+Inverted index over the in-game text of a plugin
+
+    hits = esm.text_index.phrase('imperial city')
+
+Every FULL, DESC and NAM1 subrecord is one document. Documents are
+tokenized in a single pass into lowercase words; each term maps to a
+postings list of (document, word position) pairs, which answers term
+queries directly and phrase queries by matching consecutive positions.
+Terms, postings and documents are flat arrays, saved and mmapped back
+like the other indexes.
+"""
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+import re
+import struct
+from .espesmformat import record_body, scan_subrecords
+from .index import IndexCache
+
+_header = struct.Struct('<4sLLL')
+_subrecord_type = struct.Struct('<L')
+
+TEXT_SUBRECORDS = ('FULL', 'DESC', 'NAM1')
+
+_word = re.compile(r'\w+')
+
+# type is the subrecord type; subrecord is the offset of the subrecord as
+# in Record.subrecord_index: into the file, or into the inflated body of
+# compressed records
+Hit = namedtuple('Hit', ['formid', 'record', 'subrecord', 'type'])
+
+
+def tokenize(text):
+    return _word.findall(text.lower())
+
+
+def _texts(buffer, offset, wanted, plugin=None):
+    """
+    Yield (subrecord offset, raw type, text bytes) of the subrecords of a
+    wanted type of the record at offset
+    """
+    buf, start, end = record_body(buffer, offset, plugin)
+    for type, position, size in scan_subrecords(buf, start, end):
+        if type in wanted:
+            text = buf[position + 6:position + 6 + size].tobytes()
+            yield position, type, text.split(b'\0', 1)[0]
+
+
+class _Terms:
+    """Sequence view of the sorted terms, for bisect"""
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return len(self.index.term_starts) - 1
+
+    def __getitem__(self, i):
+        starts = self.index.term_starts
+        return bytes(self.index.terms[starts[i]:starts[i + 1]])
+
+
+class TextIndex:
+    # arrays of the same length as the postings or the documents
+    posting_arrays = ('docs', 'positions')
+    document_arrays = ('formids', 'records', 'subrecords', 'types')
+
+    def __init__(self, terms, term_starts, posting_starts, docs, positions,
+                 formids, records, subrecords, types):
+        self.terms = terms  # sorted latin1 terms, concatenated
+        self.term_starts = term_starts  # n + 1 start offsets into terms
+        self.posting_starts = posting_starts  # n + 1 start offsets into postings
+        self.docs = docs  # document of each posting
+        self.positions = positions  # word position of each posting
+        self.formids = formids
+        self.records = records
+        self.subrecords = subrecords
+        self.types = types
+        self._terms = _Terms(self)
+
+    @classmethod
+    def build(cls, buffer, start, end, subrecord_types=TEXT_SUBRECORDS, plugin=None):
+        wanted = {type.encode('latin1') for type in subrecord_types}
+        postings = {}  # term -> array of doc, position pairs
+        formids, records, subrecords, types = (array('I') for _ in range(4))
+        offset = start
+        while offset < end:
+            type, size, flags, formid = _header.unpack_from(buffer, offset)
+            if type == b'GRUP':
+                offset += 20
+                continue
+            for position, stype, text in _texts(buffer, offset, wanted, plugin):
+                doc = len(formids)
+                formids.append(formid)
+                records.append(offset)
+                subrecords.append(position)
+                types.append(_subrecord_type.unpack(stype)[0])
+                for i, term in enumerate(tokenize(text.decode('latin1'))):
+                    entries = postings.get(term)
+                    if entries is None:
+                        entries = postings[term] = array('I')
+                    entries.append(doc)
+                    entries.append(i)
+            offset += 20 + size
+
+        terms = bytearray()
+        term_starts = array('I', [0])
+        posting_starts = array('I', [0])
+        docs, positions = array('I'), array('I')
+        for term in sorted(postings):
+            entries = postings[term]
+            terms += term.encode('latin1')
+            term_starts.append(len(terms))
+            docs.extend(entries[0::2])
+            positions.extend(entries[1::2])
+            posting_starts.append(len(docs))
+        return cls(bytes(terms), term_starts, posting_starts, docs, positions,
+                   formids, records, subrecords, types)
+
+    def __len__(self):
+        """Number of distinct terms"""
+        return len(self._terms)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._terms[i].decode('latin1')
+
+    def __contains__(self, term):
+        return self._find(term) is not None
+
+    def _find(self, term):
+        raw = term.lower().encode('latin1', 'replace')
+        i = bisect_left(self._terms, raw)
+        if i < len(self) and self._terms[i] == raw:
+            return i
+        return None
+
+    def _postings(self, term):
+        """(doc, position) pairs of a term, in document order"""
+        i = self._find(term)
+        if i is None:
+            return []
+        start, end = self.posting_starts[i], self.posting_starts[i + 1]
+        return zip(self.docs[start:end], self.positions[start:end])
+
+    def hit(self, doc):
+        return Hit(
+            self.formids[doc], self.records[doc], self.subrecords[doc],
+            _subrecord_type.pack(self.types[doc]).decode('latin1'))
+
+    def term(self, term):
+        """Hits of the documents containing term, in file order"""
+        docs = sorted({doc for doc, position in self._postings(term)})
+        return [self.hit(doc) for doc in docs]
+
+    def phrase(self, text):
+        """Hits of the documents containing the words of text in sequence"""
+        words = tokenize(text)
+        if not words:
+            return []
+        # doc -> positions, for every word after the first
+        following = []
+        for word in words[1:]:
+            positions = {}
+            for doc, position in self._postings(word):
+                positions.setdefault(doc, set()).add(position)
+            if not positions:
+                return []
+            following.append(positions)
+        docs = set()
+        for doc, position in self._postings(words[0]):
+            if doc in docs:
+                continue
+            if all(position + i in positions.get(doc, ())
+                   for i, positions in enumerate(following, 1)):
+                docs.add(doc)
+        return [self.hit(doc) for doc in sorted(docs)]
+
+
+class TextIndexCache(IndexCache):
+    """
+    Sidecar file holding the TextIndex of a plugin, next to the IndexCache.
+
+    Layout: a fixed header, the term and posting start offsets, the
+    posting arrays, the document arrays and the terms.
+    """
+    suffix = '.t4txt'
+    magic = b'T4TX'
+    version = 1
+    # magic, version, source size, source mtime_ns, fingerprint,
+    # number of terms, length of the terms, number of postings, number of
+    # documents
+    header = struct.Struct('<4sIQQ16sIIII')
+
+    def load(self, buffer, stack):
+        """The mapped TextIndex if the sidecar matches buffer, else None"""
+        mapped = self._map(buffer, stack)
+        if mapped is None:
+            return None
+        view, (num_terms, terms_length, num_postings, num_docs) = mapped
+        position = self.header.size
+
+        def take(count):
+            nonlocal position
+            start, position = position, position + count * 4
+            return stack.enter_context(view[start:position].cast('I'))
+
+        arrays = [take(num_terms + 1), take(num_terms + 1)]
+        arrays += [take(num_postings) for _ in TextIndex.posting_arrays]
+        arrays += [take(num_docs) for _ in TextIndex.document_arrays]
+        terms = stack.enter_context(view[position:position + terms_length])
+        return TextIndex(terms, *arrays)
+
+    def save(self, buffer, index):
+        names = (('term_starts', 'posting_starts') + TextIndex.posting_arrays +
+                 TextIndex.document_arrays)
+        parts = [array('I', getattr(index, name)).tobytes() for name in names]
+        parts.append(index.terms)
+        self._write(
+            buffer,
+            (len(index), len(index.terms), len(index.docs), len(index.formids)),
+            parts)
@@ -0,0 +1,179 @@
+"""
+Copy-on-write editing of plugins
+
+Edits are kept in an overlay keyed by record offset. Saving copies every
+untouched byte range straight from the source (os.sendfile where it is
+available, memoryview slices otherwise), writes only the edited records
+re-serialized and patches the size of each group enclosing them.
+"""
+import os
+import struct
+import zlib
+from pathlib import Path
+from .espesmformat import Record
+
+_record_header = struct.Struct('<4sLLLL')
+_group_size = struct.Struct('<L')
+_subrecord_header = struct.Struct('<4sH')
+
+COPY_CHUNK = 1 << 24
+
+
+def serialize_subrecord(type, data):
+    """A subrecord, preceded by an XXXX subrecord if data is over 64 KiB"""
+    type = type.encode('latin1')
+    if len(data) > 0xFFFF:
+        return (_subrecord_header.pack(b'XXXX', 4) + _group_size.pack(len(data)) +
+                _subrecord_header.pack(type, 0) + data)
+    return _subrecord_header.pack(type, len(data)) + data
+
+
+def serialize_record(type, flags, formid, vc_info, subrecords):
+    """
+    A whole record from (type, bytes) subrecord pairs, compressed again if
+    flags has is_compressed set. vc_info is the raw 32 bit value.
+    """
+    body = b''.join(serialize_subrecord(t, data) for t, data in subrecords)
+    if flags & Record.flags.mask('is_compressed'):
+        body = _group_size.pack(len(body)) + zlib.compress(body)
+    return _record_header.pack(
+        type.encode('latin1'), len(body), flags, formid, vc_info) + body
+
+
+class _Edit:
+    def __init__(self, record):
+        type, size, flags, formid, vc_info = _record_header.unpack_from(
+            record._buffer, record._offset)
+        self.type = record.type
+        self.flags = flags
+        self.formid = formid
+        self.vc_info = vc_info
+        self.total_size = record.total_size
+        self.subrecords = [
+            (subrecord.type, subrecord.body_buffer.tobytes())
+            for subrecord in record.subrecords
+        ]
+
+    def serialize(self):
+        return serialize_record(
+            self.type, self.flags, self.formid, self.vc_info, self.subrecords)
+
+
+class PluginWriter:
+    """
+    Overlay of record edits on an open EspEsmFormat; see EspEsmFormat.edit
+    """
+    def __init__(self, esm):
+        self.esm = esm
+        self._edits = {}  # record offset -> _Edit
+
+    def __len__(self):
+        return len(self._edits)
+
+    def _edit(self, record):
+        edit = self._edits.get(record._offset)
+        if edit is None:
+            edit = self._edits[record._offset] = _Edit(record)
+        return edit
+
+    def replace(self, record, subrecords):
+        """Replace all subrecords of record with (type, bytes) pairs"""
+        self._edit(record).subrecords = [
+            (type, bytes(data)) for type, data in subrecords]
+
+    def set_subrecord(self, record, type, data, index=0):
+        """
+        Set the index-th subrecord of a type, appending it if the record
+        has fewer of them
+        """
+        subrecords = self._edit(record).subrecords
+        seen = 0
+        for i, (t, _) in enumerate(subrecords):
+            if t == type:
+                if seen == index:
+                    subrecords[i] = (type, bytes(data))
+                    return
+                seen += 1
+        subrecords.append((type, bytes(data)))
+
+    def set_flags(self, record, flags):
+        """Replace the raw flags of record, keeping its compression as is"""
+        edit = self._edit(record)
+        compressed = Record.flags.mask('is_compressed')
+        edit.flags = flags & ~compressed | edit.flags & compressed
+
+    def _ancestors(self, target):
+        """Offsets of the groups enclosing target, outermost first"""
+        buffer = self.esm.view
+        ancestors = []
+        offset, end = self.esm.header_size, self.esm.total_size
+        while offset < end:
+            type, size = _record_header.unpack_from(buffer, offset)[:2]
+            total_size = size if type == b'GRUP' else size + 20
+            if type == b'GRUP' and offset < target < offset + total_size:
+                ancestors.append(offset)
+                offset, end = offset + 20, offset + total_size
+            else:
+                offset += total_size
+        return ancestors
+
+    def patches(self):
+        """Sorted (offset, replaced length, new bytes) of the edits"""
+        patches = []
+        deltas = {}
+        for offset, edit in self._edits.items():
+            data = edit.serialize()
+            patches.append((offset, edit.total_size, data))
+            delta = len(data) - edit.total_size
+            if delta:
+                for group in self._ancestors(offset):
+                    deltas[group] = deltas.get(group, 0) + delta
+        buffer = self.esm.view
+        for group, delta in deltas.items():
+            size = _group_size.unpack_from(buffer, group + 4)[0]
+            patches.append((group + 4, 4, _group_size.pack(size + delta)))
+        patches.sort(key=lambda patch: patch[0])
+        return patches
+
+    def write(self, out):
+        """Write the edited plugin to the binary file object out"""
+        position = 0
+        for offset, length, data in self.patches():
+            self._copy(out, position, offset)
+            out.write(data)
+            position = offset + length
+        self._copy(out, position, self.esm.total_size)
+
+    def _copy(self, out, start, end):
+        source = getattr(self.esm, '_file', None)
+        if source is not None and hasattr(os, 'sendfile'):
+            try:
+                out_fd = out.fileno()
+            except (AttributeError, OSError):
+                pass
+            else:
+                out.flush()
+                while start < end:
+                    sent = os.sendfile(
+                        out_fd, source.fileno(), start, min(end - start, COPY_CHUNK))
+                    if not sent:
+                        raise IOError('unexpected end of %s' % source.name)
+                    start += sent
+                return
+        view = self.esm.view
+        while start < end:
+            stop = min(end, start + COPY_CHUNK)
+            with view[start:stop] as chunk:
+                out.write(chunk)
+            start = stop
+
+    def save(self, path):
+        """
+        Write the edited plugin to path through a temporary file, so path
+        may be the plugin being edited.
+        """
+        path = Path(str(path))
+        tmp_path = path.with_name(path.name + '.tmp')
+        with tmp_path.open('wb') as out:
+            self.write(out)
+        os.replace(str(tmp_path), str(path))
@@ -0,0 +1,9 @@
+import pytest
+import esmdata
+
+
+@pytest.fixture
+def plugin_path(tmp_path):
+    path = tmp_path / 'Sample.esp'
+    path.write_bytes(esmdata.sample_plugin())
+    return path
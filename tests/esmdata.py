@@ -0,0 +1,170 @@
+"""
+Helpers to build small .esp/.esm images in memory for the tests
+"""
+import struct
+import zlib
+
+
+def zstring(text):
+    return text.encode('latin1') + b'\0'
+
+
+def subrecord(type, data):
+    return struct.pack('<4sH', type.encode('latin1'), len(data)) + data
+
+
+def extended_subrecord(type, data):
+    """A subrecord whose size is given by a preceding XXXX subrecord"""
+    return (subrecord('XXXX', struct.pack('<L', len(data))) +
+            struct.pack('<4sH', type.encode('latin1'), 0) + data)
+
+
+def record(type, formid, *subrecords, flags=0, vc_info=0, compressed=False):
+    body = b''.join(subrecords)
+    if compressed:
+        flags |= 0x40000
+        body = struct.pack('<L', len(body)) + zlib.compress(body)
+    return struct.pack(
+        '<4sLLLL', type.encode('latin1'), len(body), flags, formid, vc_info
+    ) + body
+
+
+def group(label, *children, group_type=0, stamp=0):
+    if isinstance(label, str):
+        label = label.encode('latin1')
+    elif isinstance(label, int):
+        label = struct.pack('<L', label)
+    body = b''.join(children)
+    return struct.pack(
+        '<4sL4sLL', b'GRUP', len(body) + 20, label, group_type, stamp
+    ) + body
+
+
+def header(*masters, flags=0):
+    subrecords = [subrecord('HEDR', struct.pack('<fLL', 0.8, 0, 0))]
+    for master in masters:
+        subrecords.append(subrecord('MAST', zstring(master)))
+        subrecords.append(subrecord('DATA', bytes(8)))
+    return record('TES4', 0, *subrecords, flags=flags)
+
+
+def clot(formid, edid, name, gold_value, weight, flags=0):
+    return record(
+        'CLOT', formid,
+        subrecord('EDID', zstring(edid)),
+        subrecord('FULL', zstring(name)),
+        subrecord('DATA', struct.pack('<Lf', gold_value, weight)),
+        flags=flags,
+    )
+
+
+def refr(type, formid, base, x, y, z):
+    return record(
+        type, formid,
+        subrecord('NAME', struct.pack('<L', base)),
+        subrecord('DATA', struct.pack('<6f', x, y, z, 0, 0, 0)),
+    )
+
+
+def exterior_cell(formid, x, y, *references):
+    return record(
+        'CELL', formid,
+        subrecord('DATA', b'\x02'),
+        subrecord('XCLC', struct.pack('<ll', x, y)),
+    ) + group(
+        formid,
+        group(formid, *references, group_type=9),
+        group_type=6,
+    )
+
+
+def info(formid, quest, *responses):
+    return record(
+        'INFO', formid,
+        subrecord('QSTI', struct.pack('<L', quest)),
+        subrecord('CTDA', bytes(24)),
+        *[subrecord('NAM1', zstring(response)) for response in responses],
+    )
+
+
+def sample_plugin():
+    """
+    A small plugin with regular top groups as well as the nested
+    CELL, WRLD and DIAL hierarchies
+    """
+    return header(flags=0x01) + group(
+        'GMST',
+        record('GMST', 0x0100, subrecord('EDID', zstring('fSample'))),
+    ) + group(
+        'CLOT',
+        clot(0x0200, 'CiirtasRobes', "Ciirta's Robes", 8, 4.0),
+        clot(0x0201, 'BrownShirt', 'Brown Shirt', 2, 1.0),
+        clot(0x0202, 'OldShirt', 'Old Shirt', 1, 1.0, flags=0x20),
+    ) + group(
+        'CELL',
+        group(
+            0,
+            group(
+                0,
+                record(
+                    'CELL', 0x0400,
+                    subrecord('EDID', zstring('TestCell')),
+                    subrecord('DATA', b'\x01'),
+                ),
+                group(
+                    0x0400,
+                    group(0x0400, refr('REFR', 0x0401, 0x0200, 1, 2, 3),
+                          group_type=8),
+                    group(0x0400, refr('REFR', 0x0402, 0x0201, 4, 5, 6),
+                          group_type=9),
+                    group_type=6,
+                ),
+                group_type=3,
+            ),
+            group_type=2,
+        ),
+    ) + group(
+        'WRLD',
+        record('WRLD', 0x0500, subrecord('EDID', zstring('Tamriel'))),
+        group(
+            0x0500,
+            group(
+                struct.pack('<hh', 0, 0),
+                group(
+                    struct.pack('<hh', 0, 0),
+                    exterior_cell(
+                        0x0510, 0, 0,
+                        refr('REFR', 0x0511, 0x0201, 100, 200, 0),
+                    ),
+                    exterior_cell(
+                        0x0520, 1, 0,
+                        refr('ACHR', 0x0521, 0x0202, 5000, 100, 0),
+                    ),
+                    group_type=5,
+                ),
+                group_type=4,
+            ),
+            group_type=1,
+        ),
+    ) + group(
+        'DIAL',
+        record(
+            'DIAL', 0x0600,
+            subrecord('EDID', zstring('GREETING')),
+            subrecord('QSTI', struct.pack('<L', 0x0700)),
+            subrecord('FULL', zstring('Greeting')),
+        ),
+        group(
+            0x0600,
+            info(0x0601, 0x0700, 'Hello there.'),
+            info(0x0602, 0x0700, 'Welcome to the Imperial City.', 'Farewell.'),
+            group_type=7,
+        ),
+    ) + group(
+        'QUST',
+        record(
+            'QUST', 0x0700,
+            subrecord('EDID', zstring('MQ01')),
+            subrecord('FULL', zstring('Deliverance')),
+        ),
+    )
@@ -2,6 +2,7 @@
 import pytest
 from tes4py.binutils import *
 from enum import IntEnum
+import struct
 
 def test_flags():
     flags = Flags(0b101, a=0b010, b=0b001, c=0b011)
@@ -52,3 +53,71 @@ def test_flagfield(dummystruct):
     assert not dummystruct.flags.a
     assert dummystruct.flags.b
     assert dummystruct.flags.c
+
+
+def test_flagfield_mask():
+    field = FlagsField(a=0b010, b=0b001, c=0b011)
+    assert field.mask('a') == 0b010
+    assert field.mask('a', 'b') == 0b011
+
+
+@pytest.fixture
+def compiledstruct():
+
+    class CompiledDummy(CompiledStruct):
+        header_size = 4
+
+        def __init__(self, buffer):
+            self.buffer = buffer
+        numfield = ULongField[0:2]
+        enumfield = ULongField(DummyEnum)[0:2]  # overlaps numfield
+        flags = FlagsField(a=0b010, b=0b001, c=0b011)[2:3]
+        fixstr = FixStrField[4:6]  # past header_size
+
+    return CompiledDummy(memoryview(DATA))
+
+
+def test_compiled_layout(compiledstruct):
+    layout = type(compiledstruct)._layout
+    assert layout.struct.format == '<HB'
+    assert [field.name for field in layout.fields] == ['numfield', 'flags']
+
+
+def test_compiled_fields(compiledstruct):
+    assert compiledstruct.numfield == 0x42
+    values = compiledstruct._struct_values
+    assert compiledstruct.flags.b
+    assert compiledstruct._struct_values is values
+    assert compiledstruct.enumfield == DummyEnum.life_universe_everything
+    assert compiledstruct.fixstr == DATASTR[4:6]
+
+
+def test_namedtuple_fmt():
+    field = NamedTupleField('<BBH', 'VCInfo', ['day', 'month', 'owner'])[0:4]
+    assert field.fmt == 'BBH'
+    assert field[0:8].fmt is None
+
+
+def test_unpack_body():
+    assert ZStringField().unpack_body(DATA, 3, 12) == 'HelloWorld!'
+    assert ScalarField('<H').unpack_body(DATA, 0, 2) == 0x42
+    assert FormIdField().unpack_body(b'\0\x01\0\0\0', 1, 4) == 0x01
+    tfield = NamedTupleField('<B1s', 'TField', ['a', 'b'])
+    assert tfield.unpack_body(DATA, 0, 2).a == 0x42
+    with pytest.raises(struct.error):
+        tfield.unpack_body(DATA, 0, 1)
+
+
+def test_format_codes():
+    assert format_codes('<fB3xLfH') == ['f', 'B', 'L', 'f', 'H']
+    assert format_codes('<6f') == ['f'] * 6
+    assert format_codes('4sL') == ['4s', 'L']
+
+
+def test_format_offsets():
+    assert format_offsets('<fB3xLfH') == [0, 4, 8, 12, 16]
+    assert format_offsets('<h2xLh') == [0, 4, 8]
+    assert format_offsets('<4sL') == [0, 4]
+    field = NamedTupleField('<h2xLh', 'Entry', ['level', 'item', 'count'], ['item'])
+    assert field.formid_offsets == (4,)
+    assert FormIdField().formid_offsets == (0,)
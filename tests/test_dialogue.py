@@ -0,0 +1,106 @@
+import esmdata
+from tes4py.espesmformat import *
+from tes4py import synthetic
+
+
+def test_topics(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        dialogue = esm.dialogue_index
+        assert list(dialogue.topics) == [0x0600] and 0x0600 in dialogue
+        assert dialogue.topic_quests(0x0600) == [0x0700]
+        assert dialogue.quest_topics(0x0700) == [0x0600]
+        assert dialogue.quest_topics(0x0999) == []
+        first, second = dialogue.infos(0x0600)
+        assert (first.formid, second.formid) == (0x0601, 0x0602)
+        assert first.offset == esm.by_formid(0x0601).offset
+        assert first.quest == second.quest == 0x0700
+        assert len(first.conditions) == 1 and len(second.responses) == 2
+        assert [SubRecord(esm.view, offset).zstring for offset in second.responses] == [
+            'Welcome to the Imperial City.', 'Farewell.']
+        assert SubRecord(esm.view, first.conditions[0]).type == 'CTDA'
+        assert dialogue.topic_of(0x0602) == 0x0600
+
+
+def test_compressed(tmp_path):
+    path = tmp_path / 'Compressed.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'DIAL',
+        esmdata.record('DIAL', 0x0600, esmdata.subrecord('EDID', esmdata.zstring('Topic'))),
+        esmdata.group(
+            0x0600,
+            esmdata.record(
+                'INFO', 0x0601,
+                esmdata.subrecord('QSTI', b'\x00\x07\x00\x00'),
+                esmdata.subrecord('NAM1', esmdata.zstring('Packed.')),
+                compressed=True,
+            ),
+            group_type=7,
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        dialogue = esm.dialogue_index
+        info, = dialogue.infos(0x0600)
+        assert dialogue.topic_quests(0x0600) == []
+        assert dialogue.quest_topics(0x0700) == [0x0600]
+        assert info.offset in esm.decompression_cache
+        body = esm.by_formid(0x0601).body
+        assert SubRecord(body, info.responses[0]).zstring == 'Packed.'
+        assert esm.decompression_cache.stats['hits'] == 1
+
+
+def test_extended_responses(tmp_path):
+    response = 'Go on. ' * 10000
+    path = tmp_path / 'Extended.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'DIAL',
+        esmdata.record('DIAL', 0x0600),
+        esmdata.group(
+            0x0600,
+            esmdata.record(
+                'INFO', 0x0601,
+                esmdata.extended_subrecord('NAM1', esmdata.zstring(response)),
+                esmdata.subrecord('NAM1', esmdata.zstring('Short.')),
+            ),
+            group_type=7,
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        info, = esm.dialogue_index.infos(0x0600)
+        assert [SubRecord(esm.view, offset).type for offset in info.responses] == [
+            'NAM1', 'NAM1']
+        assert esm.by_formid(0x0601).getall('NAM1')[0].zstring == response
+
+
+def test_matches_walk(tmp_path):
+    path = tmp_path / 'Synthetic.esp'
+    synthetic.generate(path, 1 << 20, seed=7)
+    with EspEsmFormat(path) as esm:
+        dialogue = esm.dialogue_index
+        expected = {}
+        for path, record in esm['DIAL'].walk():
+            if record.type == 'DIAL':
+                topic = expected[record.formid] = []
+            elif record.type == 'INFO':
+                topic.append(record.formid)
+        assert list(dialogue.topics) == list(expected)
+        for topic, infos in expected.items():
+            assert [info.formid for info in dialogue.infos(topic)] == infos
+
+
+def test_split_topic_children(tmp_path):
+    path = tmp_path / 'Split.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'DIAL',
+        esmdata.record('DIAL', 0x0600),
+        esmdata.group(0x0600, esmdata.record('INFO', 0x0601), group_type=7),
+        esmdata.record('DIAL', 0x0610),
+        esmdata.group(0x0610, esmdata.record('INFO', 0x0611), group_type=7),
+        esmdata.group(0x0600, esmdata.record('INFO', 0x0602), group_type=7),
+        esmdata.record('DIAL', 0x0620),
+    ))
+    with EspEsmFormat(path) as esm:
+        dialogue = esm.dialogue_index
+        assert [info.formid for info in dialogue.infos(0x0600)] == [0x0601, 0x0602]
+        assert [info.formid for info in dialogue.infos(0x0610)] == [0x0611]
+        assert dialogue.infos(0x0620) == []
+        assert dialogue.topic_of(0x0602) == 0x0600
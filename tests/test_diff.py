@@ -0,0 +1,59 @@
+import struct
+import esmdata
+from tes4py.espesmformat import *
+from tes4py.diff import SubrecordChange, identical_to_master
+from tes4py.loadorder import LoadOrder
+
+
+def test_diff(tmp_path, plugin_path):
+    new_path = tmp_path / 'New.esp'
+    new_path.write_bytes(esmdata.header() + esmdata.group(
+        'CLOT',
+        # stored compressed now, same data
+        esmdata.record(
+            'CLOT', 0x0200,
+            esmdata.subrecord('EDID', esmdata.zstring('CiirtasRobes')),
+            esmdata.subrecord('FULL', esmdata.zstring("Ciirta's Robes")),
+            esmdata.subrecord('DATA', struct.pack('<Lf', 8, 4.0)),
+            vc_info=0x1234, compressed=True,
+        ),
+        esmdata.clot(0x0201, 'BrownShirt', 'Brown Shirt', 3, 1.0),
+        esmdata.clot(0x0203, 'NewShirt', 'New Shirt', 1, 1.0),
+    ) + esmdata.group(
+        'QUST',
+        esmdata.record(
+            'QUST', 0x0700,
+            esmdata.subrecord('EDID', esmdata.zstring('MQ01')),
+            esmdata.subrecord('FULL', esmdata.zstring('Deliverance')),
+            esmdata.subrecord('FULL', esmdata.zstring('Again')),
+            flags=0x20,
+        ),
+    ))
+    with EspEsmFormat(plugin_path) as old, EspEsmFormat(new_path) as new:
+        result = old.diff(new)
+    assert result.added == [0x0203]
+    assert 0x0200 not in result.removed
+    assert result.removed == [
+        0x0100, 0x0202, 0x0400, 0x0401, 0x0402, 0x0500, 0x0510, 0x0511,
+        0x0520, 0x0521, 0x0600, 0x0601, 0x0602]
+    shirt, quest = result.modified
+    assert shirt.formid == 0x0201 and shirt.flags is None
+    assert shirt.subrecords == [SubrecordChange(
+        'DATA', 0, struct.pack('<Lf', 2, 1.0), struct.pack('<Lf', 3, 1.0))]
+    assert quest.flags == (0, 0x20)
+    assert quest.subrecords == [SubrecordChange('FULL', 1, None, b'Again\0')]
+
+
+def test_identical_to_master(tmp_path, plugin_path):
+    master = tmp_path / 'Sample.esm'
+    plugin_path.rename(master)
+    patch = tmp_path / 'Patch.esp'
+    patch.write_bytes(esmdata.header('Sample.esm') + esmdata.group(
+        'CLOT',
+        esmdata.clot(0x00000200, 'CiirtasRobes', "Ciirta's Robes", 8, 4.0),
+        esmdata.clot(0x00000201, 'BrownShirt', 'Fine Brown Shirt', 20, 1.0),
+        esmdata.clot(0x01000800, 'NewShirt', 'New Shirt', 5, 1.0),
+    ))
+    with LoadOrder([master, patch]) as load_order:
+        assert identical_to_master(load_order, 1) == [0x0200]
+        assert identical_to_master(load_order, 0) == []
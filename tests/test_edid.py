@@ -0,0 +1,50 @@
+import pytest
+import esmdata
+from tes4py.espesmformat import *
+from tes4py.edid import EdidCache
+
+
+def test_lookups(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        index = esm.edid_index
+        assert list(index) == sorted(index, key=str.lower)
+        assert 'GREETING' in index and 'MQ01' in index
+        assert esm.by_edid('BrownShirt').formid == 0x0201
+        assert esm.by_edid('GREETING').formid == 0x0600
+        with pytest.raises(KeyError):
+            esm.by_edid('brownshirt')
+        assert esm.by_edid('brownshirt', case_sensitive=False).formid == 0x0201
+        assert index.get('Nothing') is None
+        names = [edid for edid, offset in index.prefix('b')]
+        assert 'BrownShirt' in names
+        assert all(name.lower().startswith('b') for name in names)
+        assert len(list(index.prefix('', limit=2))) == 2
+
+
+def test_compressed(tmp_path):
+    path = tmp_path / 'Compressed.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'NPC_',
+        esmdata.record(
+            'NPC_', 0x0300,
+            esmdata.subrecord('EDID', esmdata.zstring('Ciirta')),
+            esmdata.subrecord('FULL', esmdata.zstring('Ciirta')),
+            compressed=True,
+        ),
+        esmdata.record('NPC_', 0x0301, esmdata.subrecord('FULL', esmdata.zstring('Nobody'))),
+    ))
+    with EspEsmFormat(path) as esm:
+        assert list(esm.edid_index) == ['Ciirta']
+        assert esm.by_edid('Ciirta').formid == 0x0300
+
+
+def test_cache(plugin_path, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    with EspEsmFormat(plugin_path, index_cache=cache_dir) as esm:
+        built = list(esm.edid_index)
+    assert (cache_dir / (plugin_path.name + EdidCache.suffix)).exists()
+    with EspEsmFormat(plugin_path, index_cache=cache_dir) as esm:
+        index = esm.edid_index
+        assert isinstance(index.names, memoryview)
+        assert list(index) == built
+        assert esm.by_edid('CiirtasRobes').formid == 0x0200
@@ -1,9 +1,12 @@
 import pytest
 from tes4py.espesmformat import *
 import contextlib
+import io
 from pathlib import Path
 import mmap
 import weakref
+import struct
+import esmdata
 
 def test_accept1():
     esm = EspEsmFormat('E:/HDSteamLib/steamapps/common/Oblivion/data/Oblivion.esm')
@@ -15,4 +18,227 @@ def test_accept1():
         idata = clot_r['DATA'].item_data
         assert idata.gold_value == 8
         assert idata.weight == 4.0
-        assert clot_r['FULL'].zstring ==  "Ciirta's Robes"
\ No newline at end of file
+        assert clot_r['FULL'].zstring ==  "Ciirta's Robes"
+
+def test_by_formid(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        record = esm.by_formid(0x0201)
+        assert record.type == 'CLOT'
+        assert record.formid == 0x0201
+        assert record['FULL'].zstring == 'Brown Shirt'
+        assert esm.by_formid(0x0100)['EDID'].zstring == 'fSample'
+        assert len(esm.formid_index) == 16
+        assert 0x0202 in esm.formid_index
+        with pytest.raises(KeyError):
+            esm.by_formid(0xdead)
+
+
+def test_compressed_record(tmp_path):
+    path = tmp_path / 'Compressed.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'NPC_',
+        esmdata.record(
+            'NPC_', 0x0300,
+            esmdata.subrecord('EDID', esmdata.zstring('Ciirta')),
+            esmdata.subrecord('FULL', esmdata.zstring('Ciirta')),
+            compressed=True,
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        npc = esm.by_formid(0x0300)
+        assert npc.flags.is_compressed
+        assert list(npc) == ['EDID', 'FULL']
+        assert npc['FULL'].zstring == 'Ciirta'
+        cache = esm.decompression_cache
+        assert cache.stats['hits'] >= 1
+        assert cache.stats['entries'] == 1
+    assert cache.stats['entries'] == 0
+    standalone = Record(path.read_bytes(), npc.offset)
+    assert standalone['FULL'].zstring == 'Ciirta'
+
+
+def test_decompression_cache_per_plugin():
+    def plugin(name):
+        return esmdata.header() + esmdata.group(
+            'NPC_',
+            esmdata.record(
+                'NPC_', 0x0300,
+                esmdata.subrecord('FULL', esmdata.zstring(name)),
+                compressed=True,
+            ),
+        )
+    for i in range(200):
+        # plugins that are not entered and are freed right away
+        esm = EspEsmFormat(plugin('NPC %d' % i))
+        assert esm.by_formid(0x0300)['FULL'].zstring == 'NPC %d' % i
+        del esm
+
+
+def test_groups_include_nested(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        assert list(esm) == ['GMST', 'CLOT', 'CELL', 'WRLD', 'DIAL', 'QUST']
+        assert esm['CELL'].records == []
+        block, = esm['CELL'].groups
+        assert block.group_type == GroupType.interior_cell_block
+        assert block.key == 0
+        world = esm['WRLD']
+        assert [r.formid for r in world.records] == [0x0500]
+        children, = world.groups
+        assert children.group_type == GroupType.world_children
+        assert children.key == 0x0500
+
+
+def test_walk(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        walked = [
+            (tuple(g.group_type for g in path), record.formid)
+            for path, record in esm.walk()
+        ]
+        assert len(walked) == 16
+        assert walked[0] == ((GroupType.top,), 0x0100)
+        assert (
+            (GroupType.top, GroupType.interior_cell_block,
+             GroupType.interior_cell_subblock, GroupType.cell_children,
+             GroupType.cell_temporary_children),
+            0x0402,
+        ) in walked
+        assert walked[-1] == ((GroupType.top,), 0x0700)
+
+        exterior, = [
+            path[-3] for path, record in esm.walk() if record.formid == 0x0511
+        ]
+        assert exterior.group_type == GroupType.exterior_cell_subblock
+        assert exterior.key == (0, 0)
+
+
+def test_walk_skips_subtrees(plugin_path):
+    entered = []
+
+    def persistent_only(group, path):
+        entered.append(group.group_type)
+        return group.group_type != GroupType.cell_temporary_children
+
+    with EspEsmFormat(plugin_path) as esm:
+        references = [
+            record.formid for path, record in esm['CELL'].walk(persistent_only)
+            if record.type == 'REFR'
+        ]
+    assert references == [0x0401]
+    assert entered.count(GroupType.cell_temporary_children) == 1
+
+
+def test_nodes_have_no_dict(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        group = esm['CLOT']
+        record = group.records[0]
+        subrecord = record['DATA']
+        for node in (group, record, subrecord):
+            assert not hasattr(node, '__dict__')
+        assert subrecord.item_data.gold_value == 8
+
+
+def test_cursor(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        group = esm['CLOT']
+        cursor = list(group.record_cursor())
+        assert all(record is cursor[0] for record in cursor)
+        seen = [(r.formid, r.offset) for r in group.record_cursor()]
+        assert seen == [(r.formid, r.offset) for r in group.records]
+
+        record = group.records[0]
+        subrecords = [(s.type, s.size) for s in record.subrecord_cursor()]
+        assert subrecords == [(s.type, s.size) for s in record.subrecords]
+
+
+def test_subrecord_size_from_header():
+    buf = memoryview(esmdata.subrecord('FULL', esmdata.zstring('Chest')))
+    subrecord = SubRecord(buf, 0)
+    assert (subrecord.type, subrecord.size, subrecord.total_size) == ('FULL', 6, 12)
+    assert subrecord.zstring == 'Chest'
+    assert SubRecord(buf, 0, 3).total_size == 9
+
+
+def test_repeated_and_extended_subrecords(tmp_path):
+    big = bytes(range(256)) * 300  # more than a 16 bit size can hold
+    path = tmp_path / 'Repeated.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'CONT',
+        esmdata.record(
+            'CONT', 0x0800,
+            esmdata.subrecord('EDID', esmdata.zstring('Chest')),
+            esmdata.subrecord('CNTO', struct.pack('<Ll', 0x0200, 1)),
+            esmdata.subrecord('CNTO', struct.pack('<Ll', 0x0201, 2)),
+            esmdata.subrecord('XXXX', struct.pack('<L', len(big))),
+            struct.pack('<4sH', b'DATA', 0) + big,
+            esmdata.subrecord('FULL', esmdata.zstring('Chest')),
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        chest = esm.by_formid(0x0800)
+        assert list(chest) == ['EDID', 'CNTO', 'CNTO', 'DATA', 'FULL']
+        assert [s.formid for s in chest.getall('CNTO')] == [0x0200, 0x0201]
+        assert chest['CNTO'].formid == 0x0200
+        assert chest.getall('SCRI') == []
+        assert chest['DATA'].size == len(big)
+        assert chest['DATA'].body_buffer.tobytes() == big
+        assert chest['FULL'].zstring == 'Chest'
+        assert 'SCRI' not in chest
+        with pytest.raises(KeyError):
+            chest['SCRI']
+
+
+def test_read_only_by_default(plugin_path):
+    plugin_path.chmod(0o444)
+    with EspEsmFormat(plugin_path) as esm:
+        assert esm.view.readonly
+        assert esm['CLOT'].records[0]['FULL'].zstring == "Ciirta's Robes"
+        esm.advise('sequential')
+        esm.advise('random', 100, 10)
+        esm.prefetch(esm['WRLD'])
+
+
+def test_writable(plugin_path):
+    with EspEsmFormat(plugin_path, writable=True, access='random') as esm:
+        assert not esm.view.readonly
+
+
+@pytest.mark.parametrize('wrap', [bytes, bytearray, memoryview, io.BytesIO])
+def test_buffer_sources(plugin_path, wrap):
+    esm = EspEsmFormat(wrap(plugin_path.read_bytes()))
+    assert esm.header.flags.isesm
+    assert esm.total_size == plugin_path.stat().st_size
+    assert list(esm) == ['GMST', 'CLOT', 'CELL', 'WRLD', 'DIAL', 'QUST']
+    with esm:
+        assert esm.by_formid(0x0201)['FULL'].zstring == 'Brown Shirt'
+        esm.advise('willneed')
+    with pytest.raises(ValueError):
+        esm.view.tobytes()  # released on exit
+
+
+@pytest.mark.parametrize('wrap', [bytes, bytearray, io.BytesIO])
+def test_reenter_buffer_source(plugin_path, wrap):
+    esm = EspEsmFormat(wrap(plugin_path.read_bytes()))
+    for _ in range(2):
+        with esm:
+            assert esm.by_formid(0x0201)['FULL'].zstring == 'Brown Shirt'
+
+
+def test_resizable_sources_are_released(plugin_path):
+    source = bytearray(plugin_path.read_bytes())
+    with EspEsmFormat(source) as esm:
+        len(esm.formid_index)
+    source += b'appended'
+    stream = io.BytesIO(plugin_path.read_bytes())
+    with EspEsmFormat(stream) as esm:
+        len(esm.formid_index)
+    stream.write(b'appended')
+
+
+def test_mmap_source(plugin_path):
+    with plugin_path.open('rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with EspEsmFormat(mm) as esm:
+                assert len(esm.formid_index) == 16
+                assert esm.by_formid(0x0201)['FULL'].zstring == 'Brown Shirt'
+                esm.advise('sequential')
+        assert mm.closed
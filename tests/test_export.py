@@ -0,0 +1,38 @@
+import csv
+import io
+import json
+from tes4py.espesmformat import *
+from tes4py import export
+from tes4py.__main__ import main
+
+
+def test_iter_rows_filters(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        rows = list(export.iter_rows(esm, groups=['CELL', 'WRLD'], types=['REFR']))
+        assert [row['formid'] for row in rows] == [0x0401, 0x0402, 0x0511]
+        assert {row['group'] for row in rows} == {'CELL', 'WRLD'}
+        assert esm._groups_cache is None
+
+
+def test_jsonl(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        out = io.StringIO()
+        assert export.export(esm, out, types=['CLOT']) == 3
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert rows[0]['fields'] == {
+        'EDID': 'CiirtasRobes',
+        'FULL': "Ciirta's Robes",
+        'DATA': {'gold_value': 8, 'weight': 4.0},
+    }
+    assert rows[2]['flags'] == 0x20
+
+
+def test_cli_csv(plugin_path, tmp_path):
+    output = tmp_path / 'out.csv'
+    main(['export', str(plugin_path), '-f', 'csv', '-g', 'DIAL', '-o', str(output)])
+    with output.open(newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['type'] for row in rows] == ['DIAL', 'INFO', 'INFO']
+    assert rows[0]['edid'] == 'GREETING'
+    assert rows[1]['formid'] == '00000601'
+    assert json.loads(rows[2]['fields'])['NAM1'][1] == 'Farewell.'
@@ -0,0 +1,79 @@
+import pytest
+np = pytest.importorskip('numpy')
+import esmdata
+from tes4py.espesmformat import *
+from tes4py.extract import StringColumn
+
+
+def test_extract(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        columns = esm.extract('CLOT', ['FULL', 'DATA.gold_value', 'DATA.weight'])
+    assert columns['formid'].tolist() == [0x0200, 0x0201, 0x0202]
+    assert isinstance(columns['FULL'], StringColumn)
+    assert columns['FULL'].tolist() == ["Ciirta's Robes", 'Brown Shirt', 'Old Shirt']
+    assert columns['DATA.gold_value'].dtype == np.uint32
+    assert columns['DATA.gold_value'].tolist() == [8, 2, 1]
+    assert columns['DATA.weight'].dtype == np.float32
+    assert columns['DATA.weight'].tolist() == [4.0, 1.0, 1.0]
+
+
+def test_extract_nested(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        refs = esm.extract('REFR', ['NAME', 'DATA.x'])
+    assert refs['formid'].tolist() == [0x0401, 0x0402, 0x0511]
+    assert refs['NAME'].tolist() == [0x0200, 0x0201, 0x0201]
+    assert refs['DATA.x'].tolist() == [1, 4, 100]
+
+
+def test_extract_missing_values(tmp_path):
+    path = tmp_path / 'Missing.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'CLOT',
+        esmdata.record('CLOT', 0x0200, esmdata.subrecord('EDID', esmdata.zstring('A'))),
+        esmdata.record(
+            'CLOT', 0x0201,
+            esmdata.subrecord('FULL', esmdata.zstring('B')),
+            esmdata.subrecord('DATA', b'\x05\0\0\0\0\0\x80\x3f'),
+            compressed=True,
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        columns = esm.extract('CLOT', ['FULL', 'DATA.weight'])
+    assert columns['FULL'].tolist() == ['', 'B']
+    assert np.isnan(columns['DATA.weight'][0])
+    assert columns['DATA.weight'][1] == 1.0
+
+
+def test_extract_extended(tmp_path):
+    name = 'Long ' * 20000
+    path = tmp_path / 'Extended.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'CLOT',
+        esmdata.record(
+            'CLOT', 0x0200,
+            esmdata.extended_subrecord('FULL', esmdata.zstring(name)),
+            esmdata.subrecord('DATA', b'\x05\0\0\0\0\0\x80\x3f'),
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        columns = esm.extract('CLOT', ['FULL', 'DATA.gold_value'])
+    assert columns['FULL'].tolist() == [name]
+    assert columns['DATA.gold_value'].tolist() == [5]
+
+
+def test_extract_errors(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        with pytest.raises(ValueError):
+            esm.extract('CLOT', ['DATA'])
+        with pytest.raises(ValueError):
+            esm.extract('CLOT', ['DATA.nope'])
+        with pytest.raises(ValueError):
+            esm.extract('CLOT', ['XYZW'])
+
+
+def test_extract_dataframe(plugin_path):
+    pytest.importorskip('pandas')
+    with EspEsmFormat(plugin_path) as esm:
+        frame = esm.extract('CLOT', ['FULL', 'DATA.gold_value'], dataframe=True)
+    assert list(frame.columns) == ['formid', 'FULL', 'DATA.gold_value']
+    assert frame['FULL'].tolist()[0] == "Ciirta's Robes"
@@ -0,0 +1,56 @@
+from tes4py.espesmformat import *
+from tes4py.index import *
+
+
+def test_header_table(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        table = esm.header_table
+        assert len(table) == 35
+        gmst, gmst_record, clot = table[0], table[1], table[2]
+        assert gmst.type == b'GRUP' and gmst.depth == 0
+        assert gmst.parent == NO_PARENT
+        assert gmst_record.type == b'GMST' and gmst_record.depth == 1
+        assert gmst_record.parent == gmst.offset
+        assert clot.parent == NO_PARENT
+        assert table[5].formid == 0x0202
+        assert table[5].flags == 0x20
+        assert max(entry.depth for entry in table) == 6
+        assert [e.offset for e in table] == [e.offset for e in iter(table)]
+
+
+def test_formid_index_from_table(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        index = FormIdIndex.from_table(esm.header_table)
+        built = FormIdIndex.build(esm.view, esm.header_size, esm.total_size)
+        assert list(index.formids) == list(built.formids)
+        assert list(index.offsets) == list(built.offsets)
+
+
+def test_index_cache_roundtrip(plugin_path, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    with EspEsmFormat(plugin_path, index_cache=cache_dir) as esm:
+        expected = bytes(esm.header_table.data)
+        labels = [g.label for g in esm.groups]
+    sidecar = cache_dir / (plugin_path.name + IndexCache.suffix)
+    assert sidecar.exists()
+
+    with EspEsmFormat(plugin_path, index_cache=cache_dir) as esm:
+        assert isinstance(esm.header_table.data, memoryview)
+        assert bytes(esm.header_table.data) == expected
+        assert [g.label for g in esm.groups] == labels
+        assert esm.by_formid(0x0201)['FULL'].zstring == 'Brown Shirt'
+
+
+def test_index_cache_invalidated(plugin_path):
+    with EspEsmFormat(plugin_path, index_cache=True) as esm:
+        pass
+    sidecar = plugin_path.with_name(plugin_path.name + IndexCache.suffix)
+    assert sidecar.exists()
+
+    data = bytearray(plugin_path.read_bytes())
+    data[-2:-1] = b'f'  # change the last FULL string
+    plugin_path.write_bytes(bytes(data))
+
+    with EspEsmFormat(plugin_path, index_cache=True) as esm:
+        assert isinstance(esm.header_table.data, bytearray)
+        assert esm.by_formid(0x0700)['FULL'].zstring == 'Deliverancf'
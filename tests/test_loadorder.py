@@ -0,0 +1,47 @@
+import pytest
+import esmdata
+from tes4py.loadorder import LoadOrder
+
+
+@pytest.fixture
+def load_order_paths(tmp_path, plugin_path):
+    master = tmp_path / 'Sample.esm'
+    plugin_path.rename(master)
+    patch = tmp_path / 'Patch.esp'
+    patch.write_bytes(esmdata.header('Sample.esm') + esmdata.group(
+        'CLOT',
+        esmdata.clot(0x00000201, 'BrownShirt', 'Fine Brown Shirt', 20, 1.0),
+        esmdata.clot(0x01000800, 'NewShirt', 'New Shirt', 5, 1.0),
+    ))
+    return [master, patch]
+
+
+def test_winner(load_order_paths):
+    with LoadOrder(load_order_paths) as load_order:
+        assert load_order.plugins[1].masters == ['Sample.esm']
+        assert load_order[0x0201]['FULL'].zstring == 'Fine Brown Shirt'
+        assert load_order[0x0200]['FULL'].zstring == "Ciirta's Robes"
+        plugin, record = load_order.winner(0x01000800)
+        assert plugin.path.name == 'Patch.esp'
+        assert record['FULL'].zstring == 'New Shirt'
+        assert 0x00000800 not in load_order
+        with pytest.raises(KeyError):
+            load_order[0x0dead]
+
+
+def test_overrides(load_order_paths):
+    with LoadOrder(load_order_paths) as load_order:
+        overrides = load_order.overrides(0x0201)
+        assert [p.path.name for p, r in overrides] == ['Sample.esm', 'Patch.esp']
+        assert [r['DATA'].item_data.gold_value for p, r in overrides] == [2, 20]
+        assert load_order.resolve(1, 0x01000800) == 0x01000800
+        assert load_order.resolve(1, 0x00000201) == 0x00000201
+        assert len(load_order) == 17 == len(list(load_order))
+        assert load_order.mod_indices(1) == [0, 1]
+        assert load_order.mod_indices(1) is load_order.mod_indices(1)
+
+
+def test_missing_master(load_order_paths):
+    with pytest.raises(KeyError):
+        with LoadOrder(load_order_paths[1:]):
+            pass
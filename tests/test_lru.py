@@ -0,0 +1,31 @@
+from tes4py.lru import ByteLRUCache
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = ByteLRUCache(10)
+    cache.put('a', b'xxxx')
+    cache.put('b', b'xxxx')
+    assert cache.get('a') == b'xxxx'
+    cache.put('c', b'xxxx')
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert cache.size == 8
+    assert cache.stats['evictions'] == 1
+
+
+def test_hit_miss_stats():
+    cache = ByteLRUCache(10)
+    assert cache.get('a') is None
+    cache.put('a', b'x')
+    cache.get('a')
+    assert cache.stats['hits'] == 1
+    assert cache.stats['misses'] == 1
+
+
+def test_oversized_values_are_not_kept():
+    cache = ByteLRUCache(4)
+    cache.put('a', b'xx')
+    assert cache.put('b', b'xxxxxxxx') == b'xxxxxxxx'
+    assert 'b' not in cache
+    assert 'a' in cache
+
@@ -0,0 +1,34 @@
+from tes4py.espesmformat import *
+from tes4py.index import HeaderTable
+from tes4py import parallel
+
+
+def test_partition_covers_file_in_order(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        spans = list(parallel.partition(esm.view, esm.header_size, esm.total_size, 64))
+        assert spans[0][0] == esm.header_size
+        assert spans[-1][1] == esm.total_size
+        for (start, end, _), (next_start, _, _) in zip(spans, spans[1:]):
+            assert end == next_start
+        assert any(enclosing for _, _, enclosing in spans)
+
+        table = HeaderTable(bytearray().join(
+            HeaderTable.build(esm.view, *span).data for span in spans))
+        assert table.data == esm.header_table.data
+
+
+def test_parallel_header_table(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        expected = bytes(esm.header_table.data)
+    assert bytes(parallel.header_table(plugin_path, processes=2).data) == expected
+
+    with EspEsmFormat(plugin_path) as esm:
+        esm.scan_parallel(processes=2)
+        assert esm.by_formid(0x0521).type == 'ACHR'
+
+
+def test_scan_parallel_in_memory(plugin_path):
+    esm = EspEsmFormat(plugin_path.read_bytes())
+    esm.scan_parallel(processes=2)
+    assert len(esm.header_table) == len(EspEsmFormat(plugin_path.read_bytes()).header_table)
+    assert esm.by_formid(0x0521).type == 'ACHR'
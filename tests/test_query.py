@@ -0,0 +1,73 @@
+import pytest
+from tes4py.espesmformat import *
+from tes4py import query
+
+
+def formids(records):
+    return [record.formid for record in records]
+
+
+def test_type_and_flags(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        assert formids(esm.query(type='CLOT')) == [0x0200, 0x0201, 0x0202]
+        assert formids(esm.query(type='CLOT', flags='~deleted')) == [0x0200, 0x0201]
+        assert formids(esm.query(type='CLOT', flags=['deleted'])) == [0x0202]
+        assert formids(esm.query(type=['REFR', 'ACHR'])) == [0x0401, 0x0402, 0x0511, 0x0521]
+        assert formids(esm.query(type='INFO')) == [0x0601, 0x0602]
+        with pytest.raises(KeyError):
+            list(esm.query(flags='~nonsense'))
+
+
+def test_formid_group_where(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        assert formids(esm.query(formid=range(0x0500, 0x0600))) == [
+            0x0500, 0x0510, 0x0511, 0x0520, 0x0521]
+        assert formids(esm.query(formid={0x0100, 0x0700})) == [0x0100, 0x0700]
+        assert formids(esm.query(formid=0x0602)) == [0x0602]
+        assert formids(esm.query(type='REFR', group='CELL')) == [0x0401, 0x0402]
+        assert formids(esm.query(type='CLOT', group='CELL')) == []
+        expensive = esm.query(
+            type='CLOT', where=lambda record: record.decoded()['DATA'].gold_value > 5)
+        assert formids(expensive) == [0x0200]
+
+
+def test_skips_groups(plugin_path):
+    q = query.Query(type='CELL')
+    assert q.groups == {'CELL', 'WRLD'}
+    with EspEsmFormat(plugin_path) as esm:
+        seen = []
+        q = query.Query(type='CELL', where=lambda record: seen.append(record.type) or True)
+        assert formids(q.scan(esm.view, esm.header_size, esm.total_size)) == [
+            0x0400, 0x0510, 0x0520]
+        assert seen == ['CELL'] * 3
+
+
+def test_memoize(plugin_path):
+    query.query_cache.clear()
+    with EspEsmFormat(plugin_path) as esm:
+        def where(record):
+            calls.append(record.formid)
+            return True
+        calls = []
+        first = formids(esm.query(type='CLOT', where=where, memoize=True))
+        assert calls == first
+        assert len(query.query_cache) == 1
+        hits = query.query_cache.hits
+        # where is not part of the memo, and is called again on every run
+        calls = []
+        assert formids(esm.query(type='CLOT', where=where, memoize=True)) == first
+        assert calls == first
+        assert formids(esm.query(
+            type='CLOT', where=lambda record: record.formid > 0x0200,
+            memoize=True)) == first[1:]
+        assert query.query_cache.hits == hits + 2
+        # an incomplete run is not memoized
+        next(esm.query(type='GMST', memoize=True))
+        assert len(query.query_cache) == 1
+
+
+def test_memoize_needs_path(plugin_path):
+    esm = EspEsmFormat(bytearray(plugin_path.read_bytes()))
+    with pytest.raises(ValueError):
+        esm.query(type='CLOT', memoize=True)
+    assert formids(esm.query(type='CLOT')) == [0x0200, 0x0201, 0x0202]
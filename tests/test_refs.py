@@ -0,0 +1,57 @@
+import struct
+import esmdata
+from tes4py.espesmformat import *
+
+
+def test_references(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        assert esm.references(0x0511) == [0x0201]
+        assert esm.references(0x0521) == [0x0202]
+        assert esm.referenced_by(0x0201) == [0x0402, 0x0511]
+        assert esm.referenced_by(0x0700) == [0x0600, 0x0601, 0x0602]
+        assert esm.references(0x0200) == []
+        assert esm.referenced_by(0xdead) == []
+
+
+def test_schema_fields(tmp_path):
+    path = tmp_path / 'Refs.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'CONT',
+        esmdata.record(
+            'CONT', 0x0800,
+            esmdata.subrecord('SCRI', struct.pack('<L', 0x0900)),
+            esmdata.subrecord('CNTO', struct.pack('<Ll', 0x0200, 5)),
+            esmdata.subrecord('CNTO', struct.pack('<Ll', 0x0201, 1)),
+            esmdata.subrecord('CNTO', struct.pack('<Ll', 0x0200, 2)),
+            compressed=True,
+        ),
+    ) + esmdata.group(
+        'LVLI',
+        esmdata.record(
+            'LVLI', 0x0801,
+            esmdata.subrecord('LVLO', struct.pack('<h2xLh2x', 1, 0x0200, 1)),
+            # a null reference and a body too short for its layout
+            esmdata.subrecord('SCRI', struct.pack('<L', 0)),
+            esmdata.subrecord('LVLO', b'\1\0'),
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        assert esm.references(0x0800) == [0x0200, 0x0201, 0x0900]
+        assert esm.references(0x0801) == [0x0200]
+        assert esm.referenced_by(0x0200) == [0x0800, 0x0801]
+        graph = esm.reference_graph
+        assert len(graph.references) == 2 and len(graph.referenced_by) == 3
+
+
+def test_extended_subrecords(tmp_path):
+    path = tmp_path / 'Extended.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'CONT',
+        esmdata.record(
+            'CONT', 0x0800,
+            esmdata.extended_subrecord('SCRI', struct.pack('<L', 0x0900)),
+            esmdata.subrecord('CNTO', struct.pack('<Ll', 0x0200, 1)),
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        assert esm.references(0x0800) == [0x0200, 0x0900]
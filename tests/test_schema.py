@@ -0,0 +1,55 @@
+import pytest
+import esmdata
+from tes4py.espesmformat import *
+from tes4py.schema import *
+
+
+def test_decoded(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        robes = esm.by_formid(0x0200).decoded()
+        assert robes == {
+            'EDID': 'CiirtasRobes',
+            'FULL': "Ciirta's Robes",
+            'DATA': (8, 4.0),
+        }
+        assert robes['DATA'].gold_value == 8
+
+        header = esm.header.decoded()
+        assert header['HEDR'].version == pytest.approx(0.8)
+
+        info = esm.by_formid(0x0602).decoded()
+        assert info['QSTI'] == 0x0700
+        assert info['NAM1'] == ['Welcome to the Imperial City.', 'Farewell.']
+        assert info['CTDA'][0].function == 0
+
+        reference = esm.by_formid(0x0511).decoded()
+        assert reference['NAME'] == 0x0201
+        assert (reference['DATA'].x, reference['DATA'].y) == (100, 200)
+
+
+def test_unknown_and_short_subrecords(tmp_path):
+    path = tmp_path / 'Odd.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'WEAP',
+        esmdata.record(
+            'WEAP', 0x0900,
+            esmdata.subrecord('DATA', b'\x01\x02'),
+            esmdata.subrecord('ZZZZ', b'ab'),
+            esmdata.subrecord('ZZZZ', b'cd'),
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        assert esm.by_formid(0x0900).decoded() == {
+            'DATA': b'\x01\x02',
+            'ZZZZ': [b'ab', b'cd'],
+        }
+
+
+def test_registry_overrides_any():
+    registry = Schema()
+    registry.register([ANY], ['DATA'], zstring)
+    registry.register(['WEAP'], ['DATA'], formid)
+    assert registry.lookup('WEAP', 'DATA') == (formid, False)
+    assert registry.lookup('CLOT', 'DATA') == (zstring, False)
+    assert registry.lookup('CLOT', 'NONE') is None
+    assert registry.layouts('WEAP')['DATA'] == (formid, False)
@@ -0,0 +1,73 @@
+import struct
+import esmdata
+from tes4py.espesmformat import *
+from tes4py import synthetic
+from tes4py.spatial import cell_of
+
+
+def formids(placed):
+    return sorted(p.formid for p in placed)
+
+
+def test_queries(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        index = esm.spatial_index
+        assert list(index) == [0x0500]
+        world = index[0x0500]
+        assert len(world) == 2
+        assert world.cells == {
+            (0, 0): esm.by_formid(0x0510).offset,
+            (1, 0): esm.by_formid(0x0520).offset,
+        }
+        assert formids(world.box(0, 0, 10000, 10000)) == [0x0511, 0x0521]
+        assert formids(world.box(0, 0, 4095, 4095)) == [0x0511]
+        assert world.box(-100, -100, -1, -1) == []
+        placed, = world.radius(5000, 0, 150)
+        assert (placed.formid, placed.x, placed.y) == (0x0521, 5000, 100)
+        assert world.radius(5000, 0, 50) == []
+        assert formids(world.in_cell(1, 0)) == [0x0521]
+
+
+def test_extended_subrecords(tmp_path):
+    path = tmp_path / 'Extended.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'WRLD',
+        esmdata.record('WRLD', 0x0500),
+        esmdata.group(
+            0x0500,
+            esmdata.record(
+                'CELL', 0x0510,
+                esmdata.extended_subrecord('XCLC', struct.pack('<ll', 2, 3)),
+            ),
+            esmdata.record(
+                'REFR', 0x0511,
+                esmdata.extended_subrecord('DATA', struct.pack('<6f', 9000, 13000, 0, 0, 0, 0)),
+            ),
+            group_type=1,
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        world = esm.spatial_index[0x0500]
+        assert list(world.cells) == [(2, 3)]
+        assert formids(world.in_cell(2, 3)) == [0x0511]
+
+
+def test_matches_scan(tmp_path):
+    path = tmp_path / 'Synthetic.esp'
+    synthetic.generate(path, 1 << 20, seed=5)
+    with EspEsmFormat(path) as esm:
+        world, = esm.spatial_index.values()
+        positions = {
+            record.formid: record.decoded()['DATA']
+            for path, record in esm['WRLD'].walk()
+            if record.type in ('REFR', 'ACHR')
+        }
+        assert len(world) == len(positions)
+        box = (5000.0, 3000.0, 20000.0, 9000.0)
+        expected = sorted(
+            formid for formid, p in positions.items()
+            if box[0] <= p.x <= box[2] and box[1] <= p.y <= box[3])
+        assert expected and formids(world.box(*box)) == expected
+        for formid in world.formids[:20]:
+            p = positions[formid]
+            assert cell_of(p.x, p.y) in world.cells
@@ -0,0 +1,47 @@
+import sqlite3
+from tes4py import sqlite
+
+
+def test_materialize(plugin_path, tmp_path):
+    db_path = tmp_path / 'plugins.db'
+    assert sqlite.materialize(db_path, [plugin_path]) == [plugin_path]
+    conn = sqlite3.connect(str(db_path))
+    try:
+        assert conn.execute('SELECT count(*) FROM records').fetchone() == (16,)
+        assert conn.execute(
+            "SELECT label FROM groups WHERE depth = 0 ORDER BY offset"
+        ).fetchall() == [(l,) for l in ['GMST', 'CLOT', 'CELL', 'WRLD', 'DIAL', 'QUST']]
+        referencing = conn.execute(
+            "SELECT r.formid FROM subrecords s JOIN records r "
+            "ON r.plugin_id = s.plugin_id AND r.offset = s.record_offset "
+            "WHERE s.type = 'NAME' AND s.value = ? ORDER BY r.formid",
+            (0x0201,)).fetchall()
+        assert referencing == [(0x0402,), (0x0511,)]
+        assert conn.execute(
+            "SELECT value FROM subrecords s JOIN records r "
+            "ON r.plugin_id = s.plugin_id AND r.offset = s.record_offset "
+            "WHERE r.formid = ? AND s.type = 'FULL'", (0x0201,)
+        ).fetchone() == ('Brown Shirt',)
+    finally:
+        conn.close()
+
+
+def test_refresh_only_changed(plugin_path, tmp_path):
+    db_path = tmp_path / 'plugins.db'
+    sqlite.materialize(db_path, [plugin_path])
+    assert sqlite.materialize(db_path, [plugin_path]) == []
+
+    data = bytearray(plugin_path.read_bytes())
+    data[-2:-1] = b'f'
+    plugin_path.write_bytes(bytes(data))
+    assert sqlite.materialize(db_path, [plugin_path]) == [plugin_path]
+
+    conn = sqlite3.connect(str(db_path))
+    try:
+        assert conn.execute('SELECT count(*) FROM plugins').fetchone() == (1,)
+        assert conn.execute('SELECT count(*) FROM records').fetchone() == (16,)
+        assert conn.execute(
+            "SELECT value FROM subrecords WHERE value LIKE 'Deliveranc%'"
+        ).fetchall() == [('Deliverancf',)]
+    finally:
+        conn.close()
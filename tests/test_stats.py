@@ -0,0 +1,90 @@
+from tes4py.espesmformat import *
+from tes4py.stats import Stats
+import esmdata
+
+
+def test_disabled(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        assert esm.stats is None
+        list(esm.walk())
+        assert esm._stats is None
+
+
+def test_counts(plugin_path):
+    progress = []
+    stats = Stats()
+    stats.add_callback(lambda *args: progress.append(args))
+    with EspEsmFormat(plugin_path, stats=stats) as esm:
+        assert esm._stats is stats
+        assert esm.header._stats is stats
+        records = [record for path, record in esm.walk()]
+        assert esm.by_formid(0x0201)['FULL'].zstring == 'Brown Shirt'
+        assert esm.by_formid(0x0602).getall('NAM1')
+        list(esm['CLOT'].records)
+        len(esm.header_table)
+    assert esm._stats is None
+
+    result = stats.as_dict()
+    assert result['objects']['Record'] == len(records) + 2 + 3
+    assert result['objects']['Group'] >= 10
+    assert result['objects']['SubRecord'] == 3
+    counters = result['counters']
+    assert counters['formid_lookups'] == 2
+    assert counters['subrecord_lookups'] == 2
+    assert counters['zstrings'] == 1
+    assert counters['bytes_scanned'] > 2 * esm.size
+    assert {'open', 'walk', 'formid_index', 'header_table'} <= set(result['timings'])
+    phases = [phase for phase, done, total in progress]
+    assert phases.count('walk') == len(esm) + 1
+    assert progress[-1] == ('header_table', esm.size, esm.size)
+
+
+def test_decompressions(tmp_path):
+    path = tmp_path / 'Compressed.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'NPC_',
+        esmdata.record(
+            'NPC_', 0x0300,
+            esmdata.subrecord('EDID', esmdata.zstring('Ciirta')),
+            compressed=True,
+        ),
+    ))
+    with EspEsmFormat(path, stats=True) as esm:
+        npc = esm.by_formid(0x0300)
+        npc['EDID']
+        npc['EDID']
+    result = esm.stats.as_dict()
+    assert result['counters']['decompressions'] == 1
+    assert result['counters']['decompressed_bytes'] == 13
+    assert result['decompression_cache']['misses'] == 1
+    assert result['decompression_cache']['hits'] >= 1
+    assert 'decompress' in result['timings']
+
+
+def test_other_plugins_not_counted(plugin_path):
+    stats = Stats()
+    with EspEsmFormat(plugin_path, stats=stats) as first:
+        with EspEsmFormat(plugin_path) as second:
+            for path, record in second.walk():
+                list(record.subrecords)
+            second.by_formid(0x0201)['FULL'].zstring
+        assert stats.objects['SubRecord'] == 0
+        assert stats.counters['zstrings'] == 0
+        assert first.by_formid(0x0201)['FULL'].zstring == 'Brown Shirt'
+        assert stats.counters['zstrings'] == 1
+
+
+def test_closed_out_of_order(plugin_path):
+    first = EspEsmFormat(plugin_path, stats=True)
+    second = EspEsmFormat(plugin_path, stats=True)
+    first.__enter__()
+    second.__enter__()
+    first.__exit__(None, None, None)
+    assert second._stats is second.stats
+    second.__exit__(None, None, None)
+    with EspEsmFormat(plugin_path) as esm:
+        record = esm.by_formid(0x0201)
+        assert record._stats is None
+        record['FULL'].zstring
+    assert first.stats.counters['zstrings'] == 0
+    assert second.stats.counters['zstrings'] == 0
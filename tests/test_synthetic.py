@@ -0,0 +1,59 @@
+from tes4py.espesmformat import *
+from tes4py import synthetic
+
+
+def test_generate(tmp_path):
+    path = tmp_path / 'Synthetic.esp'
+    count = synthetic.generate(path, 1 << 20, seed=3)
+    assert abs(path.stat().st_size - (1 << 20)) < 64 << 10
+    with EspEsmFormat(path) as esm:
+        assert esm.header.decoded()['HEDR'].num_records == count - 1
+        table = esm.header_table
+        assert sum(1 for entry in table if entry.type != b'GRUP') == count - 1
+        assert max(entry.depth for entry in table) == 6
+        assert set(esm) >= {'CLOT', 'NPC_', 'CELL', 'WRLD', 'DIAL', 'QUST'}
+        assert len(esm.formid_index) == count - 1
+
+        records = list(esm['CONT'].records)
+        assert any(record.flags.is_compressed for record in records)
+        for record in records:
+            items = record.decoded()['CNTO']
+            assert all(item.item in esm.formid_index for item in items)
+
+        path, cell = next((path, record) for path, record in esm.walk()
+                          if record.type == 'CELL' and path[0].label == 'WRLD')
+        grid = cell.decoded()['XCLC']
+        references = [record for path, record in cell_children(esm, cell)]
+        assert references
+        for reference in references:
+            position = reference.decoded()['DATA']
+            assert int(position.x // 4096) == grid.x
+            assert int(position.y // 4096) == grid.y
+
+
+def cell_children(esm, cell):
+    return (
+        (path, record) for path, record in esm.walk()
+        if any(group.group_type == GroupType.cell_children and
+               group.parent_formid == cell.formid for group in path)
+    )
+
+
+def test_deterministic(tmp_path):
+    first, second = tmp_path / 'a.esp', tmp_path / 'b.esp'
+    synthetic.generate(first, 200 << 10, seed=7)
+    synthetic.generate(second, 200 << 10, seed=7)
+    assert first.read_bytes() == second.read_bytes()
+    synthetic.generate(second, 200 << 10, seed=8)
+    assert first.read_bytes() != second.read_bytes()
+
+
+def test_interior_blocks_follow_budget(tmp_path):
+    path = tmp_path / 'Synthetic.esp'
+    synthetic.generate(path, 4 << 20, seed=3)
+    with EspEsmFormat(path) as esm:
+        blocks = list(esm['CELL'].groups)
+        subblocks = [len(list(block.groups)) for block in blocks]
+    assert len(blocks) > 1
+    assert abs(len(blocks) - subblocks[0]) <= 2
+    assert all(count == subblocks[0] for count in subblocks[:-1])
@@ -0,0 +1,26 @@
+import pytest
+np = pytest.importorskip('numpy')
+from tes4py.espesmformat import *
+from tes4py.table import *
+
+
+def test_header_array(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        array = esm.table()
+        assert len(array) == len(esm.header_table)
+        assert array['offset'].tolist() == [e.offset for e in esm.header_table]
+        clot = records(array, 'CLOT')
+        assert clot['formid'].tolist() == [0x0200, 0x0201, 0x0202]
+        deleted = clot[has_flags(clot, 'deleted')]
+        assert deleted['formid'].tolist() == [0x0202]
+        assert len(groups(array, 'CELL')) == 1
+        assert top_level(array)['type'].tolist() == [b'GRUP'] * 6
+
+
+def test_header_array_outlives_index_cache(plugin_path):
+    with EspEsmFormat(plugin_path, index_cache=True):
+        pass
+    with EspEsmFormat(plugin_path, index_cache=True) as esm:
+        assert isinstance(esm.header_table.data, memoryview)
+        array = esm.table()
+    assert records(array, 'CLOT')['formid'].tolist() == [0x0200, 0x0201, 0x0202]
@@ -0,0 +1,72 @@
+import esmdata
+from tes4py.espesmformat import *
+from tes4py.textindex import TextIndexCache, tokenize
+
+
+def test_tokenize():
+    assert tokenize("Ciirta's Robes, 2nd") == ['ciirta', 's', 'robes', '2nd']
+
+
+def test_term(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        index = esm.text_index
+        assert 'shirt' in index and 'Shirt' in index
+        assert 'fsample' not in index  # EDIDs are not text
+        hits = index.term('SHIRT')
+        assert [hit.formid for hit in hits] == [0x0201, 0x0202]
+        hit = hits[0]
+        record = esm.by_formid(hit.formid)
+        assert hit.record == record.offset and hit.type == 'FULL'
+        assert SubRecord(record._subitems_span()[0], hit.subrecord).zstring == 'Brown Shirt'
+        assert [(hit.formid, hit.type) for hit in index.term('the')] == [(0x0602, 'NAM1')]
+        assert index.term('nothing') == []
+
+
+def test_phrase(plugin_path):
+    with EspEsmFormat(plugin_path) as esm:
+        index = esm.text_index
+        assert [hit.formid for hit in index.phrase('the Imperial City')] == [0x0602]
+        assert index.phrase('city imperial') == []
+        assert [hit.formid for hit in index.phrase('hello there')] == [0x0601]
+        assert index.phrase('') == []
+
+
+def test_compressed_and_cache(tmp_path):
+    path = tmp_path / 'Compressed.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'BOOK',
+        esmdata.record(
+            'BOOK', 0x0300,
+            esmdata.subrecord('EDID', esmdata.zstring('Book')),
+            esmdata.subrecord('FULL', esmdata.zstring('The Book of Daedra')),
+            esmdata.subrecord('DESC', esmdata.zstring('Of Daedra and their realms')),
+            compressed=True,
+        ),
+    ))
+    cache_dir = tmp_path / 'cache'
+    with EspEsmFormat(path, index_cache=cache_dir) as esm:
+        built = list(esm.text_index)
+        assert [hit.type for hit in esm.text_index.term('daedra')] == ['FULL', 'DESC']
+    assert (cache_dir / (path.name + TextIndexCache.suffix)).exists()
+    with EspEsmFormat(path, index_cache=cache_dir) as esm:
+        index = esm.text_index
+        assert isinstance(index.terms, memoryview)
+        assert list(index) == built
+        assert [hit.formid for hit in index.phrase('book of daedra')] == [0x0300]
+
+
+def test_extended_text(tmp_path):
+    text = 'word ' * 14000  # a DESC too large for a 16 bit size
+    path = tmp_path / 'Extended.esp'
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'BOOK',
+        esmdata.record(
+            'BOOK', 0x0300,
+            esmdata.extended_subrecord('DESC', esmdata.zstring(text)),
+            esmdata.subrecord('FULL', esmdata.zstring('Last word')),
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        hits = esm.text_index.term('word')
+        assert [hit.type for hit in hits] == ['DESC', 'FULL']
+        assert SubRecord(esm.view, hits[0].subrecord).type == 'DESC'
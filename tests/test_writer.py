@@ -0,0 +1,67 @@
+import io
+import struct
+import esmdata
+from tes4py.espesmformat import *
+from tes4py.writer import *
+
+
+def test_save_edits(plugin_path, tmp_path):
+    output = tmp_path / 'Edited.esp'
+    with EspEsmFormat(plugin_path) as esm:
+        writer = esm.edit()
+        writer.set_subrecord(esm.by_formid(0x0201), 'FULL', esmdata.zstring('A Much Longer Name'))
+        reference = esm.by_formid(0x0511)
+        writer.set_subrecord(reference, 'XOWN', struct.pack('<L', 0x0700))
+        writer.set_flags(esm.by_formid(0x0200), 0x20)
+        writer.save(output)
+        original = [(e.type, e.formid, e.depth) for e in esm.header_table]
+
+    with EspEsmFormat(output) as esm:
+        assert [(e.type, e.formid, e.depth) for e in esm.header_table] == original
+        assert esm.by_formid(0x0201)['FULL'].zstring == 'A Much Longer Name'
+        assert esm.by_formid(0x0201)['DATA'].item_data.gold_value == 2
+        assert esm.by_formid(0x0511)['XOWN'].formid == 0x0700
+        assert esm.by_formid(0x0200).flags.deleted
+        assert esm.by_formid(0x0700)['FULL'].zstring == 'Deliverance'
+        for entry in esm.header_table:
+            if entry.type == b'GRUP':
+                group = Group(esm.view, entry.offset)
+                assert sum(c.total_size for c in group.children) == group.size
+
+
+def test_unchanged_copy_is_identical(plugin_path):
+    out = io.BytesIO()
+    with EspEsmFormat(plugin_path) as esm:
+        esm.edit().write(out)
+    assert out.getvalue() == plugin_path.read_bytes()
+
+
+def test_save_in_place_and_compressed(tmp_path):
+    path = tmp_path / 'Compressed.esp'
+    big = bytes(70000)
+    path.write_bytes(esmdata.header() + esmdata.group(
+        'NPC_',
+        esmdata.record(
+            'NPC_', 0x0300,
+            esmdata.subrecord('FULL', esmdata.zstring('Ciirta')),
+            compressed=True,
+        ),
+    ))
+    with EspEsmFormat(path) as esm:
+        writer = esm.edit()
+        npc = esm.by_formid(0x0300)
+        writer.replace(npc, [('FULL', esmdata.zstring('Jauffre')), ('DATA', big)])
+        writer.save(path)
+
+    with EspEsmFormat(path) as esm:
+        npc = esm.by_formid(0x0300)
+        assert npc.flags.is_compressed
+        assert npc['FULL'].zstring == 'Jauffre'
+        assert npc['DATA'].size == len(big)
+        assert esm['NPC_'].total_size == 20 + npc.total_size
+
+
+def test_serialize_subrecord():
+    assert serialize_subrecord('EDID', b'ab\0') == b'EDID\x03\x00ab\0'
+    big = serialize_subrecord('DATA', bytes(0x10000))
+    assert big[:16] == b'XXXX\x04\x00\x00\x00\x01\x00DATA\x00\x00'